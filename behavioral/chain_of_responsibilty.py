@@ -1,26 +1,60 @@
 """
 Chain of responsibility design pattern
 -> It's equivalent of if....elif....elif...else condition.
+-> When every handler only checks an age range, CompiledChain turns the chain into a sorted interval table
 """
+import time
+import sys
 from abc import ABC, abstractmethod
-from typing import Optional, Any
+from bisect import bisect_right
+from collections import namedtuple
+from typing import Optional, Any, Iterable, List, Sequence, Tuple
 
-from creational.abstract_factory.game_factory import FrogWorld, GameEnvironment, WizardWorld, ArmyWorld
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from creational.abstract_factory.game_factory import (FrogWorld, GameEnvironment, WizardWorld, ArmyWorld,
+                                                      GameWorldRegistry, ObjectPool, world_registry)
 
 
 class GameHandler(ABC):
 
+    # Half-open [start, end) age range handled, None when check_age can't be described by a range
+    age_range: Optional[Tuple[int, int]] = None
+
     def __init__(self, successor: Optional["GameHandler"] = None) -> None:
         self.successor = successor
 
+    def in_range(self, age: int) -> bool:
+        return self.age_range[0] <= age < self.age_range[1]
+
     def start_game(self, age: int) -> None:
-        resp = self.check_age(age)
-        if not resp and self.successor:
-            self.successor.start_game(age)
-        elif resp:
-            print(f"Starting game: {resp}")
-            GameEnvironment(resp).play()
-            print(f"Finished game: {resp}")
+        handler = self
+        while handler:
+            resp = handler.check_age(age)
+            if resp:
+                self.play(resp)
+                return None
+            handler = handler.successor
+
+    @staticmethod
+    def play(world: Any) -> None:
+        print(f"Starting game: {world}")
+        game = GameEnvironment(world)
+        game.play()
+        game.release()
+        print(f"Finished game: {world}")
+
+    def play_group(self, ages: Sequence[int]) -> None:
+        """Start one game for a whole group of ages routed to this handler"""
+        world = self.check_age(int(ages[0]))
+        print(f"Starting game for {len(ages)} players: {world}")
+        game = GameEnvironment(world)
+        game.play()
+        game.release()
+        print(f"Finished game for {len(ages)} players: {world}")
 
     @abstractmethod
     def check_age(self, age: int) -> Optional[bool]:
@@ -28,23 +62,29 @@ class GameHandler(ABC):
 
 
 class FrogGameHandler(GameHandler):
+    age_range = (1, 18)
+
     def check_age(self, age: int) -> Optional[Any]:
-        if 1 <= age < 18:
-            return FrogWorld("Frog")
+        if self.in_range(age):
+            return world_registry.get(FrogWorld, "Frog")
         return None
 
 
 class WizardGameHandler(GameHandler):
+    age_range = (18, 30)
+
     def check_age(self, age: int) -> WizardWorld | None:
-        if 18 <= age < 30:
-            return WizardWorld("Wizard")
+        if self.in_range(age):
+            return world_registry.get(WizardWorld, "Wizard")
         return None
 
 
 class ArmyGameHandler(GameHandler):
+    age_range = (30, 50)
+
     def check_age(self, age: int) -> ArmyWorld | None:
-        if 30 <= age < 50:
-            return ArmyWorld("Army")
+        if self.in_range(age):
+            return world_registry.get(ArmyWorld, "Army")
         return None
 
 
@@ -55,6 +95,132 @@ class FallbackHandler(GameHandler):
         return None
 
 
+GameBatch = namedtuple("GameBatch", ["groups", "counts"])
+
+
+class CompiledChain:
+    """Interval lookup table built from a handler chain
+
+    -> The leading handlers that declare age_range are sorted into a boundary array searched with bisect,
+       so dispatch is O(log n) and iterative
+    -> Overlapping ranges raise ValueError at build time, uncovered ages between ranges are listed in gaps
+    -> Ages outside every range, and every handler from the first one without age_range on, go through the
+       regular dynamic check_age chain
+    """
+
+    def __init__(self, head: GameHandler) -> None:
+        ranged: List[GameHandler] = []
+        seen = set()
+        handler = head
+        while handler is not None and handler.age_range is not None:
+            if id(handler) in seen:
+                raise ValueError(f"Handler chain has a cycle at {type(handler).__name__}")
+            seen.add(id(handler))
+            ranged.append(handler)
+            handler = handler.successor
+        self.fallback: Optional[GameHandler] = handler
+
+        ranged.sort(key=lambda h: h.age_range)
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.handlers: List[GameHandler] = []
+        self.gaps: List[Tuple[int, int]] = []
+        for handler in ranged:
+            start, end = handler.age_range
+            if start >= end:
+                raise ValueError(f"Empty age range {handler.age_range} for {type(handler).__name__}")
+            if self.ends and start < self.ends[-1]:
+                raise ValueError(f"Age range {handler.age_range} of {type(handler).__name__} overlaps "
+                                 f"{self.handlers[-1].age_range} of {type(self.handlers[-1]).__name__}")
+            if self.ends and start > self.ends[-1]:
+                self.gaps.append((self.ends[-1], start))
+            self.starts.append(start)
+            self.ends.append(end)
+            self.handlers.append(handler)
+
+    def handler_for(self, age: int) -> Optional[GameHandler]:
+        """Ranged handler of age, None when the age must go through the fallback chain"""
+        index = bisect_right(self.starts, age) - 1
+        if index >= 0 and age < self.ends[index]:
+            return self.handlers[index]
+        return None
+
+    def start_game(self, age: int) -> None:
+        handler = self.handler_for(age)
+        if handler is not None:
+            GameHandler.play(handler.check_age(age))
+        elif self.fallback is not None:
+            self.fallback.start_game(age)
+
+    def route(self, ages: Iterable[int]) -> GameBatch:
+        """Bucket ages by handler in one pass (NumPy searchsorted when available, bisect otherwise)
+
+        Groups map each ranged handler to its ages, ages outside every range are grouped under None.
+        """
+        if np is not None:
+            ages = np.fromiter(ages, dtype=np.int64)
+            index = np.searchsorted(np.asarray(self.starts), ages, side="right") - 1
+            inside = (index >= 0) & (ages < np.asarray(self.ends + [0])[index])
+            index[~inside] = len(self.handlers)
+            # one stable sort by handler, the bucket sizes give the split points
+            order = np.argsort(index, kind="stable")
+            counts = np.bincount(index, minlength=len(self.handlers) + 1)
+            buckets = [group.tolist() for group in np.split(ages[order], np.cumsum(counts)[:-1])]
+            groups = dict(zip(self.handlers, buckets))
+            groups[None] = buckets[-1]
+        else:
+            starts, ends = self.starts, self.ends
+            buckets: List[List[int]] = [[] for _ in range(len(self.handlers) + 1)]
+            for age in ages:
+                i = bisect_right(starts, age) - 1
+                buckets[i if i >= 0 and age < ends[i] else -1].append(age)
+            groups = dict(zip(self.handlers, buckets))
+            groups[None] = buckets[-1]
+        groups = {handler: group for handler, group in groups.items() if len(group)}
+        return GameBatch(groups, {handler: len(group) for handler, group in groups.items()})
+
+    def start_games(self, ages: Iterable[int]) -> GameBatch:
+        """Route a whole batch of ages and start each handler once for its group.
+        Unmatched ages go through the fallback chain once per distinct age."""
+        batch = self.route(ages)
+        for handler, group in batch.groups.items():
+            if handler is not None:
+                handler.play_group(group)
+            elif self.fallback is not None:
+                for age in sorted(set(int(age) for age in group)):
+                    self.fallback.start_game(age)
+        return batch
+
+
+def benchmark_routing(games: int = 10 ** 5) -> None:
+    """Routed games per second with fresh worlds, registry worlds and registry worlds with pooled games"""
+    ages = [age % 49 + 1 for age in range(games)]
+    chain = CompiledChain(FrogGameHandler(WizardGameHandler(ArmyGameHandler())))
+    pooled_registry = GameWorldRegistry(pool=ObjectPool())
+    results = {}
+
+    start = time.perf_counter()
+    for age in ages:
+        world = chain.handler_for(age).check_age(age)
+        GameEnvironment(type(world)(world.player_name)).release()
+    results["fresh worlds"] = games / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for age in ages:
+        GameEnvironment(chain.handler_for(age).check_age(age)).release()
+    results["registry worlds"] = games / (time.perf_counter() - start)
+
+    pooled_worlds = {}
+    for handler in chain.handlers:
+        world = handler.check_age(handler.age_range[0])
+        pooled_worlds[handler] = pooled_registry.get(type(world), world.player_name)
+    start = time.perf_counter()
+    for age in ages:
+        GameEnvironment(pooled_worlds[chain.handler_for(age)]).release()
+    results["registry worlds, pooled games"] = games / (time.perf_counter() - start)
+    print(", ".join(f"{name}: {rate:,.0f} games/s" for name, rate in results.items()))
+
+
 def main():
 
     frog = FrogGameHandler()
@@ -67,6 +233,21 @@ def main():
     for age in [17, 24, 45, 60]:
         frog.start_game(age)
 
+    chain = CompiledChain(frog)
+    for age in [17, 24, 45, 60]:
+        chain.start_game(age)
+
+    batch = chain.start_games([17, 24, 45, 60, 5, 29, 33, 70])
+    print({type(handler).__name__ if handler else None: count for handler, count in batch.counts.items()})
+
+
+def benchmark():
+    """Routing throughput, run with --benchmark"""
+    benchmark_routing()
+
 
 if __name__ == '__main__':
-    main()
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        main()
@@ -8,33 +8,132 @@ Command design pattern
 Example:
     We can assume commands that handles different file operations like: create, read, delete files.
 """
+import json
 import logging
+import mmap
+import multiprocessing
 import os.path
+import sys
+import tempfile
+import threading
+import time
+import zlib
 from abc import ABC, abstractmethod
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+FileSummary = namedtuple("FileSummary", ["size", "checksum"])
+
 
 class FileOperation(ABC):
+    mutating = True
 
     @abstractmethod
     def execute(self):
         pass
 
+    def inverse(self) -> Optional["FileOperation"]:
+        """Command that reverts this one, captured from the current file state before execute()"""
+        return None
+
+    def is_applied(self) -> bool:
+        """Whether the effect of execute() is already on disk, lets the journal finish an interrupted command"""
+        return False
+
+    def to_record(self) -> Dict[str, Any]:
+        return {"cmd": type(self).__name__, "args": vars(self)}
+
+    @staticmethod
+    def from_record(record: Optional[Dict[str, Any]]) -> Optional["FileOperation"]:
+        if record is None:
+            return None
+        return COMMANDS[record["cmd"]](**record["args"])
+
+    @property
+    def paths(self) -> Tuple[str, ...]:
+        """Files this command touches, commands sharing a path are never run concurrently"""
+        return (self.file_path,)
+
 
 class ReadFile(FileOperation):
-    def __init__(self, file_path: str) -> None:
+    """Reads a file without holding it in memory, only its size and checksum are logged
+
+    --> chunks() streams through one reused buffer of buffer_size bytes
+    --> view() maps the file and gives a zero-copy memoryview for random access
+    --> lines() iterates text lines
+    """
+    mutating = False
+
+    def __init__(self, file_path: str, buffer_size: int = DEFAULT_BUFFER_SIZE, use_mmap: bool = False) -> None:
         self.file_path = file_path
+        self.buffer_size = buffer_size
+        self.use_mmap = use_mmap
 
-    def execute(self) -> None:
+    def execute(self) -> FileSummary:
         if not os.path.isfile(self.file_path):
             logger.error(f"File: {self.file_path} does not exist")
             raise Exception(f"File: {self.file_path} does not exist")
 
+        size, checksum = 0, 0
+        if self.use_mmap:
+            window = max(self.buffer_size // mmap.ALLOCATIONGRANULARITY, 1) * mmap.ALLOCATIONGRANULARITY
+            with self._map() as mapping:
+                size = len(mapping)
+                for offset in range(0, size, window):
+                    with memoryview(mapping)[offset:offset + window] as data:
+                        checksum = zlib.crc32(data, checksum)
+                    # drop the pages already summed so RSS doesn't grow to the file size
+                    if hasattr(mapping, "madvise"):
+                        mapping.madvise(mmap.MADV_DONTNEED, offset, min(window, size - offset))
+        else:
+            for chunk in self.chunks():
+                checksum = zlib.crc32(chunk, checksum)
+                size += len(chunk)
+        logger.info(f"File {self.file_path}: {size} bytes, crc32 {checksum:08x}")
+        return FileSummary(size, checksum)
+
+    def read(self) -> str:
+        """Whole file as one string, only for files known to be small"""
         with open(self.file_path, "r") as fl:
-            content = fl.read()
-            logger.info(f"File contents are : {content}")
+            return fl.read()
+
+    def chunks(self) -> Iterator[memoryview]:
+        """Yields views of a reused buffer, each one is only valid until the next is produced"""
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        with open(self.file_path, "rb", buffering=0) as fl:
+            while True:
+                read = fl.readinto(buffer)
+                if not read:
+                    break
+                yield view[:read]
+
+    @contextmanager
+    def view(self) -> Iterator[memoryview]:
+        """Read-only memoryview over an mmap of the file, slices must not outlive the with block"""
+        with self._map() as mapping, memoryview(mapping) as data:
+            yield data
+
+    @contextmanager
+    def _map(self) -> Iterator[Any]:
+        with open(self.file_path, "rb") as fl:
+            if os.fstat(fl.fileno()).st_size == 0:
+                # mmap refuses empty files
+                yield b""
+                return
+            with mmap.mmap(fl.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                yield mapping
+
+    def lines(self, encoding: str = "utf-8") -> Iterator[str]:
+        with open(self.file_path, "r", encoding=encoding, buffering=self.buffer_size) as fl:
+            yield from fl
 
     def undo(self) -> None:
         if not os.path.isfile(self.file_path):
@@ -59,6 +158,16 @@ class RenameFile(FileOperation):
         os.rename(self.src, self.dest)
         logger.info(f"File {self.src} is renamed to {self.dest}")
 
+    def inverse(self) -> "RenameFile":
+        return RenameFile(self.dest, self.src)
+
+    def is_applied(self) -> bool:
+        return not os.path.isfile(self.src) and os.path.isfile(self.dest)
+
+    @property
+    def paths(self) -> Tuple[str, ...]:
+        return self.src, self.dest
+
     def undo_rename(self) -> None:
         logger.info("Performing undo operation for renamed file.")
         os.rename(self.dest, self.src)
@@ -78,11 +187,19 @@ class DeleteFile(FileOperation):
         os.remove(self.file_path)
         logger.info(f"File {self.file_path} removed successfully")
 
+    def is_applied(self) -> bool:
+        return not os.path.isfile(self.file_path)
+
+    def to_trash(self, trash_path: str) -> RenameFile:
+        """Reversible form of this delete, the file is moved aside instead of removed"""
+        return RenameFile(self.file_path, trash_path)
+
 
 class CreateFile(FileOperation):
 
-    def __init__(self, file_path: str) -> None:
+    def __init__(self, file_path: str, text: Optional[str] = None) -> None:
         self.file_path = file_path
+        self.text = text
 
     def execute(self) -> None:
         if os.path.isfile(self.file_path):
@@ -90,11 +207,403 @@ class CreateFile(FileOperation):
             return None
 
         with open(self.file_path, "w") as fl:
-            text = input("Enter some text: ")
+            text = self.text if self.text is not None else input("Enter some text: ")
             fl.write(text)
 
         logger.info(f"File {self.file_path} is created")
 
+    def is_applied(self) -> bool:
+        return os.path.isfile(self.file_path)
+
+    def inverse(self) -> Optional[DeleteFile]:
+        # creating an existing file is skipped, so there is nothing to revert
+        return None if os.path.isfile(self.file_path) else DeleteFile(self.file_path)
+
+
+COMMANDS = {cls.__name__: cls for cls in (ReadFile, RenameFile, DeleteFile, CreateFile)}
+
+
+CommandResult = namedtuple("CommandResult", ["command", "ok", "value", "error"])
+
+
+class CommandExecutor:
+    """Runs queued FileOperations on a thread pool
+
+    --> Commands whose paths overlap (directly or through a rename) form one group that runs in submission order,
+        independent groups run concurrently
+    --> A failing command is reported in its CommandResult and doesn't stop the rest of the batch
+    """
+
+    def __init__(self, max_workers: int = 8) -> None:
+        self.max_workers = max_workers
+        self.queue: List[FileOperation] = []
+
+    def submit(self, command: FileOperation) -> None:
+        self.queue.append(command)
+
+    def run(self) -> List[CommandResult]:
+        """Execute every queued command and return results in submission order"""
+        commands, self.queue = self.queue, []
+        return self.execute(commands)
+
+    def execute(self, commands: Iterable[FileOperation]) -> List[CommandResult]:
+        commands = list(commands)
+        results: List[Optional[CommandResult]] = [None] * len(commands)
+        groups = self._group(commands)
+        if len(groups) <= 1 or self.max_workers <= 1:
+            for group in groups:
+                self._run_group(commands, group, results)
+        else:
+            # one future per worker share rather than per group keeps submit overhead off many tiny groups
+            shares = [[index for group in groups[worker::self.max_workers] for index in group]
+                      for worker in range(self.max_workers)]
+            with ThreadPoolExecutor(self.max_workers) as executor:
+                for future in [executor.submit(self._run_group, commands, share, results) for share in shares]:
+                    future.result()
+        return results
+
+    @staticmethod
+    def _group(commands: List[FileOperation]) -> List[List[int]]:
+        """Indexes of commands grouped by connected paths (union-find), each group in submission order"""
+        parent: Dict[str, str] = {}
+
+        def find(path: str) -> str:
+            root = parent.setdefault(path, path)
+            while root != parent[root]:
+                parent[root] = parent[parent[root]]
+                root = parent[root]
+            return root
+
+        for command in commands:
+            first, *others = (os.path.abspath(path) for path in command.paths)
+            for other in others:
+                parent[find(other)] = find(first)
+        groups: Dict[str, List[int]] = {}
+        for index, command in enumerate(commands):
+            groups.setdefault(find(os.path.abspath(command.paths[0])), []).append(index)
+        return list(groups.values())
+
+    @staticmethod
+    def _run_group(commands: List[FileOperation], group: List[int], results: List[Any]) -> None:
+        for index in group:
+            command = commands[index]
+            try:
+                results[index] = CommandResult(command, True, command.execute(), None)
+            except Exception as exc:
+                results[index] = CommandResult(command, False, None, exc)
+
+
+def benchmark_executor(files: int = 10_000, max_workers: int = 8) -> None:
+    """Commands per second for create/read/rename/delete of many files, serial against CommandExecutor"""
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        for workers in (1, max_workers):
+            with tempfile.TemporaryDirectory(dir=root) as directory:
+                commands: List[FileOperation] = []
+                for i in range(files):
+                    path = os.path.join(directory, f"file{i}.txt")
+                    renamed = os.path.join(directory, f"renamed{i}.txt")
+                    commands += [CreateFile(path, text="demo"), ReadFile(path), RenameFile(path, renamed),
+                                 DeleteFile(renamed)]
+                start = time.perf_counter()
+                results = CommandExecutor(max_workers=workers).execute(commands)
+                elapsed = time.perf_counter() - start
+                failed = sum(not result.ok for result in results)
+                print(f"{workers} worker(s): {len(commands) / elapsed:,.0f} commands/s, {failed} failed "
+                      f"on {directory}")
+    finally:
+        logger.setLevel(level)
+
+
+class CommandJournal:
+    """Write-ahead undo/redo journal for file commands
+
+    --> Every mutating command is appended to a JSON-lines log with its inverse before it touches the file system,
+        a done or abort record follows once it has run. undo/redo are logged the same way
+    --> Records reach the OS on every append, fsync is shared by a group of records (group commit) or happens
+        flush_interval seconds after the first unsynced record
+    --> DeleteFile is journaled as a rename to a hidden trash file next to the original, so undo is a rename back
+        and the log never holds file contents. Trash files are removed once history trims their entry
+    --> checkpoint() compacts the log into one record holding the undo/redo stacks, close() ends with one
+    --> Reopening replays the log. Only a trailing record without done/abort was interrupted by a crash: when
+        is_applied() shows its change already on disk it is marked done, otherwise it is rolled forward and
+        aborted if that fails
+    """
+
+    def __init__(self, path: str, group_size: int = 1024, flush_interval: float = 1.0,
+                 compact_after: int = 100_000, history: Optional[int] = None) -> None:
+        self.path = path
+        self.group_size = group_size
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.history = history
+        self.undo_stack: List[Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]]] = []
+        self.redo_stack: List[Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]]] = []
+        self._seq = 0
+        self._records = 0
+        self._pending = 0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        interrupted = self._recover()
+        self._file = open(self.path, "a", encoding="utf-8")
+        if interrupted is not None:
+            self._roll_forward(*interrupted)
+
+    def execute(self, command: FileOperation) -> Any:
+        if not command.mutating:
+            return command.execute()
+        self._seq += 1
+        if isinstance(command, DeleteFile):
+            directory, name = os.path.split(command.file_path)
+            command = command.to_trash(os.path.join(directory, f".{name}.{self._seq}.deleted"))
+            op = dict(command.to_record(), trash=True)
+        else:
+            op = command.to_record()
+        inverse = command.inverse()
+        entry = (self._seq, op, inverse.to_record() if inverse else None)
+        self._append({"type": "do", "seq": entry[0], "op": entry[1], "inv": entry[2]})
+        result = self._run(command.execute, entry)
+        self._complete("do", entry)
+        self._compact_if_due()
+        return result
+
+    def undo(self, n: int = 1) -> int:
+        """Revert the last n commands, returns how many were reverted"""
+        return self._move(n, self.undo_stack, "undo")
+
+    def redo(self, n: int = 1) -> int:
+        return self._move(n, self.redo_stack, "redo")
+
+    def _move(self, n: int, source: list, kind: str) -> int:
+        done = 0
+        while done < n and source:
+            entry = source[-1]
+            self._append({"type": kind, "seq": entry[0]})
+            self._run(lambda: self._apply(entry, kind), entry)
+            self._complete(kind, entry)
+            self._compact_if_due()
+            done += 1
+        return done
+
+    def _run(self, action, entry: tuple) -> Any:
+        """Runs the logged action and closes its record with done, or abort when it raises"""
+        try:
+            result = action()
+        except Exception:
+            self._append({"type": "abort", "seq": entry[0]})
+            raise
+        self._append({"type": "done", "seq": entry[0]})
+        return result
+
+    def _complete(self, kind: str, entry: tuple) -> None:
+        if kind == "do":
+            self.undo_stack.append(entry)
+            self.redo_stack.clear()
+        else:
+            source, target = (self.undo_stack, self.redo_stack) if kind == "undo" else (self.redo_stack,
+                                                                                       self.undo_stack)
+            if source and source[-1][0] == entry[0]:
+                target.append(source.pop())
+
+    @staticmethod
+    def _apply(entry: Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]], kind: str) -> None:
+        command = FileOperation.from_record(entry[2] if kind == "undo" else entry[1])
+        if command is not None:
+            command.execute()
+
+    def commit(self) -> None:
+        """Flush and fsync everything appended so far"""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def checkpoint(self) -> None:
+        """Atomically replace the log with one record holding the current stacks"""
+        with self._lock:
+            if self.history is not None:
+                trimmed = self.undo_stack[:max(len(self.undo_stack) - self.history, 0)]
+                del self.undo_stack[:len(trimmed)]
+            else:
+                trimmed = []
+            self._file.close()
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as fl:
+                fl.write(json.dumps({"type": "checkpoint", "seq": self._seq, "undo": self.undo_stack,
+                                     "redo": self.redo_stack}) + "\n")
+                fl.flush()
+                os.fsync(fl.fileno())
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._records = 1
+            self._pending = 0
+        # deletes that can no longer be undone don't need their trash file
+        for _, op, _ in trimmed:
+            if op.get("trash") and os.path.isfile(op["args"]["dest"]):
+                os.remove(op["args"]["dest"])
+
+    def close(self) -> None:
+        """Clean shutdown, the log is left as a single checkpoint"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.checkpoint()
+            self._file.close()
+
+    def __enter__(self) -> "CommandJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            # flush hands the record to the OS before the command runs, only the fsync is grouped
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self._records += 1
+            self._pending += 1
+            if self._pending >= self.group_size:
+                self.commit()
+            elif self._timer is None and self.flush_interval:
+                self._timer = threading.Timer(self.flush_interval, self._timed_commit)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _compact_if_due(self) -> None:
+        # only called once a command is done and on the stacks, a checkpoint never drops an in-flight record
+        if self._records >= self.compact_after:
+            self.checkpoint()
+
+    def _timed_commit(self) -> None:
+        with self._lock:
+            self._timer = None
+            if self._pending and not self._file.closed:
+                self.commit()
+
+    def _recover(self) -> Optional[Tuple[str, tuple]]:
+        """Rebuild the stacks from the log, returns the trailing record that never got done/abort"""
+        if not os.path.isfile(self.path):
+            return None
+        entries: Dict[int, Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]]] = {}
+        interrupted = None
+        good = 0
+        with open(self.path, "rb") as fl:
+            for line in fl:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn tail from a crash mid-append
+                good += len(line)
+                self._records += 1
+                kind = record["type"]
+                if kind == "checkpoint":
+                    self.undo_stack = [tuple(entry) for entry in record["undo"]]
+                    self.redo_stack = [tuple(entry) for entry in record["redo"]]
+                    entries.update((entry[0], entry) for entry in self.undo_stack + self.redo_stack)
+                    self._seq = record["seq"]
+                elif kind == "do":
+                    entries[record["seq"]] = (record["seq"], record["op"], record["inv"])
+                    self._seq = max(self._seq, record["seq"])
+                    interrupted = kind, entries[record["seq"]]
+                elif kind in ("undo", "redo"):
+                    entry = entries.get(record["seq"])
+                    interrupted = (kind, entry) if entry is not None else None
+                elif kind in ("done", "abort"):
+                    # a completion only closes the in-flight record with the same seq
+                    if interrupted is not None and interrupted[1][0] == record["seq"]:
+                        if kind == "done":
+                            self._complete(*interrupted)
+                        interrupted = None
+        if good != os.path.getsize(self.path):
+            with open(self.path, "r+b") as fl:
+                fl.truncate(good)
+        return interrupted
+
+    def _roll_forward(self, kind: str, entry: tuple) -> None:
+        logger.info(f"Recovering journal {self.path}: finishing interrupted {kind} of command {entry[0]}")
+        command = FileOperation.from_record(entry[2] if kind == "undo" else entry[1])
+        if command is None or command.is_applied():
+            # the crash came after the change hit the disk, only the done record is missing
+            self._append({"type": "done", "seq": entry[0]})
+        else:
+            try:
+                self._run(command.execute, entry)
+            except Exception as exc:
+                logger.warning(f"Command {entry[0]} could not be finished and was aborted: {exc}")
+                return None
+        self._complete(kind, entry)
+        self._compact_if_due()
+
+
+def benchmark_journal(commands: int = 20_000, group_size: int = 1024) -> None:
+    """Commands per second with journaling off, fsync per command and group commit
+
+    --> Files live on tmpfs when available, the journal in the default temp dir so fsync hits a real disk
+    """
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        modes = (("journal off", None), ("fsync per command", 1), (f"group commit {group_size}", group_size))
+        for label, size in modes:
+            count = commands if size != 1 else commands // 10
+            with tempfile.TemporaryDirectory(dir=root) as directory, tempfile.TemporaryDirectory() as journal_dir:
+                journal = CommandJournal(os.path.join(journal_dir, "journal.log"), group_size=size) if size else None
+                run = journal.execute if journal else (lambda command: command.execute())
+                start = time.perf_counter()
+                for i in range(count // 3):
+                    path = os.path.join(directory, f"file{i}.txt")
+                    renamed = os.path.join(directory, f"renamed{i}.txt")
+                    run(CreateFile(path, text="demo"))
+                    run(RenameFile(path, renamed))
+                    run(DeleteFile(renamed))
+                if journal:
+                    journal.close()
+                elapsed = time.perf_counter() - start
+                print(f"{label:>20}: {count // 3 * 3 / elapsed:,.0f} commands/s")
+    finally:
+        logger.setLevel(level)
+
+
+def _read_file_worker(path: str, mode: str, buffer_size: int) -> Tuple[float, int]:
+    """Runs one read mode in a fresh process, returns (seconds, peak RSS in KiB)"""
+    import resource
+    logger.setLevel(logging.WARNING)
+    command = ReadFile(path, buffer_size=buffer_size, use_mmap=mode == "mmap")
+    start = time.perf_counter()
+    if mode == "full":
+        content = command.read()
+        zlib.crc32(content.encode())
+    elif mode == "lines":
+        checksum = 0
+        for line in command.lines():
+            checksum = zlib.crc32(line.encode(), checksum)
+    else:
+        command.execute()
+    return time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def benchmark_read_file(size_mb: int = 256, buffer_size: int = DEFAULT_BUFFER_SIZE) -> None:
+    """Throughput and peak RSS of the full read against chunked, mmap and line reads of a large file"""
+    line = b"0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-=+*/\n"
+    with tempfile.NamedTemporaryFile(suffix=".txt") as fl:
+        block = line * (DEFAULT_BUFFER_SIZE // len(line))
+        for _ in range(size_mb * (1 << 20) // len(block)):
+            fl.write(block)
+        fl.flush()
+        size = os.path.getsize(fl.name)
+        context = multiprocessing.get_context("spawn")
+        for mode in ("full", "chunks", "mmap", "lines"):
+            # a fresh process per mode keeps each peak RSS separate
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                elapsed, peak = executor.submit(_read_file_worker, fl.name, mode, buffer_size).result()
+            print(f"{mode:>6}: {size / elapsed / (1 << 20):,.0f} MiB/s, peak RSS {peak / 1024:,.0f} MiB "
+                  f"for a {size / (1 << 20):,.0f} MiB file")
+
 
 class FileCommands:
 
@@ -131,6 +640,16 @@ class FileCommands:
             choice = input("Enter your choice: ")
 
 
+def benchmark():
+    """Executor, journal and file read benchmarks, run with --benchmark"""
+    benchmark_executor()
+    benchmark_journal()
+    benchmark_read_file()
+
+
 if __name__ == '__main__':
-    file_commands = FileCommands()
-    file_commands.execute()
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        file_commands = FileCommands()
+        file_commands.execute()
@@ -12,39 +12,582 @@ Example:
     --> Assume we are using the data of same model in two different views.
         Whenever the model is modified, both views needs to be updated.
 """
+import time
+import queue
+import random
+import sys
+import contextlib
+import asyncio
+import inspect
 import logging
+import threading
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, MutableMapping, Optional, Sequence
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_MISSING = object()
 
-class Publisher:
-    """Publisher that updates all observers"""
+
+class EventQueue:
+    """Bounded FIFO shared by producers and dispatcher workers
+
+    --> overflow decides what happens when the queue is full:
+        "block" waits for free space, "drop_oldest" discards the oldest event, "drop_newest" discards the new one
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+    def __init__(self, maxsize: int = 1024, overflow: str = "block") -> None:
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {self.OVERFLOW_POLICIES}: got {overflow}")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self.closed = False
+        self._items: Deque[Any] = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item: Any, can_block: bool = True) -> bool:
+        """Queue item and return False when it was dropped. Raises queue.Full if blocking is needed but not allowed"""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.overflow == "drop_newest":
+                    self.dropped += 1
+                    return False
+                if self.overflow == "drop_oldest":
+                    self._items.popleft()
+                    self.dropped += 1
+                elif not can_block:
+                    raise queue.Full("Event queue is full")
+                else:
+                    self._cond.wait_for(lambda: len(self._items) < self.maxsize or self.closed)
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self) -> Any:
+        """Next item, None once the queue is closed and empty"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self.closed)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def get_nowait(self) -> Any:
+        with self._cond:
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class PublisherState:
+    """Publisher state captured when a queued notification is created
+
+    --> data, version and batch_values are the values at notify time, so observers of a queued event see the
+        write that produced it. Every other attribute is read from the live publisher
+    """
+
+    __slots__ = ("publisher", "data", "version", "batch_values")
+
+    def __init__(self, publisher: "Publisher") -> None:
+        self.publisher = publisher
+        self.data = getattr(publisher, "data", None)
+        self.version = getattr(publisher, "version", None)
+        self.batch_values = getattr(publisher, "batch_values", None)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.publisher, name)
+
+    def view(self, name: str) -> Any:
+        return self.publisher.view_at(name, self.version, self.data)
+
+
+class Dispatcher:
+    """Delivers notifications to observers and keeps per observer latency metrics
+
+    --> Metrics are held by weak reference to the observer, so they go away with it. Observers that can't be
+        weakly referenced are tracked by id until forget() is called, Publisher.remove() does it
+    """
 
     def __init__(self) -> None:
-        self.observers = []
+        self._latency: MutableMapping[Any, List[Any]] = weakref.WeakKeyDictionary()
+        self._latency_by_id: Dict[int, List[Any]] = {}
+        self._latency_lock = threading.Lock()
+
+    def dispatch(self, publisher: "Publisher", observers: Sequence[object]) -> None:
+        self._deliver(publisher, observers)
+
+    def _stats(self, observer: object) -> List[Any]:
+        try:
+            stats = self._latency.get(observer)
+            if stats is None:
+                stats = self._latency[observer] = [f"{type(observer).__name__}@{id(observer):x}", 0, 0.0, 0.0]
+        except TypeError:
+            stats = self._latency_by_id.get(id(observer))
+            if stats is None:
+                stats = self._latency_by_id[id(observer)] = [f"{type(observer).__name__}@{id(observer):x}", 0,
+                                                             0.0, 0.0]
+        return stats
+
+    def _record(self, observer: object, elapsed: float) -> None:
+        with self._latency_lock:
+            stats = self._stats(observer)
+            stats[1] += 1
+            stats[2] += elapsed
+            stats[3] = max(stats[3], elapsed)
+
+    def forget(self, observer: object) -> None:
+        """Drop the metrics of an observer that was removed"""
+        with self._latency_lock:
+            try:
+                self._latency.pop(observer, None)
+            except TypeError:
+                pass
+            self._latency_by_id.pop(id(observer), None)
+
+    def _deliver(self, publisher: "Publisher", observers: Sequence[object]) -> None:
+        for obs in observers:
+            start = time.perf_counter()
+            try:
+                obs.notify(publisher)
+            except Exception:
+                logger.exception(f"Observer {obs} failed")
+            self._record(obs, time.perf_counter() - start)
+
+    def queue_depth(self) -> int:
+        return 0
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, dropped events and calls/avg/max latency in milliseconds per observer"""
+        with self._latency_lock:
+            observers = {
+                name: {"calls": calls, "avg_ms": total / calls * 1000, "max_ms": worst * 1000}
+                for name, calls, total, worst in (*self._latency.values(), *self._latency_by_id.values())
+            }
+        events = getattr(self, "queue", None)
+        return {"queue_depth": self.queue_depth(), "dropped": events.dropped if events is not None else 0,
+                "observers": observers}
+
+
+class ThreadPoolDispatcher(Dispatcher):
+    """Queues every notification and lets a pool of worker threads deliver it
+
+    --> The writer only pays for queueing, slow observers delay the workers instead
+    --> Observers run after the setter returned, they get a PublisherState with the data of their event
+    """
+
+    def __init__(self, workers: int = 4, maxsize: int = 1024, overflow: str = "block") -> None:
+        super().__init__()
+        self.queue = EventQueue(maxsize, overflow)
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def dispatch(self, publisher: "Publisher", observers: Sequence[object]) -> None:
+        self.queue.put((PublisherState(publisher), observers))
+
+    def _work(self) -> None:
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return None
+            self._deliver(*event)
+
+    def queue_depth(self) -> int:
+        return len(self.queue)
+
+    def close(self) -> None:
+        """Deliver the queued notifications and stop the workers"""
+        self.queue.close()
+        for worker in self._workers:
+            worker.join()
+
+
+class AsyncioDispatcher(Dispatcher):
+    """Delivers notifications on an asyncio event loop
+
+    --> Observers whose notify is "async def" are awaited concurrently, plain observers are called directly
+    --> notify() may be called from the loop or from any other thread. With overflow "block" a full queue
+        blocks other threads but raises queue.Full inside the loop thread, where waiting would deadlock.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = 1024, overflow: str = "block") -> None:
+        super().__init__()
+        self.loop = loop
+        self.queue = EventQueue(maxsize, overflow)
+        self._draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def dispatch(self, publisher: "Publisher", observers: Sequence[object]) -> None:
+        in_loop = _running_loop() is self.loop
+        if self.queue.put((PublisherState(publisher), observers), can_block=not in_loop):
+            if in_loop:
+                self._schedule()
+            else:
+                self.loop.call_soon_threadsafe(self._schedule)
+
+    def _schedule(self) -> None:
+        if not self._draining:
+            self._draining = True
+            self._idle.clear()
+            self.loop.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        try:
+            while True:
+                event = self.queue.get_nowait()
+                if event is None:
+                    return None
+                await self._deliver_async(*event)
+        finally:
+            self._draining = False
+            self._idle.set()
+
+    async def _timed(self, obs: object, awaitable: Awaitable, start: float) -> None:
+        try:
+            await awaitable
+        except Exception:
+            logger.exception(f"Observer {obs} failed")
+        self._record(obs, time.perf_counter() - start)
+
+    async def _deliver_async(self, publisher: "Publisher", observers: Sequence[object]) -> None:
+        pending = []
+        for obs in observers:
+            start = time.perf_counter()
+            try:
+                result = obs.notify(publisher)
+            except Exception:
+                logger.exception(f"Observer {obs} failed")
+                continue
+            if inspect.isawaitable(result):
+                pending.append(self._timed(obs, result, start))
+            else:
+                self._record(obs, time.perf_counter() - start)
+        if pending:
+            await asyncio.gather(*pending)
+
+    def queue_depth(self) -> int:
+        return len(self.queue)
+
+    async def join(self) -> None:
+        """Wait until every queued notification was delivered, must be awaited on the dispatcher loop"""
+        await self._idle.wait()
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class Publisher:
+    """Publisher that updates all observers
+
+    --> Observers are kept in an insertion ordered dict used as a set, add/remove are O(1)
+    --> notify() iterates a tuple snapshot that is rebuilt only after add/remove, not on every event
+    --> With weak=True only weak references are kept and garbage collected observers drop out on their own
+    --> Observers are called inline by default, a Dispatcher (thread pool, asyncio) can deliver them instead
+    """
+
+    def __init__(self, weak: bool = False, dispatcher: Optional[Dispatcher] = None) -> None:
+        self.weak = weak
+        self.dispatcher = dispatcher
+        self._observers: Dict[Any, None] = {}
+        self._snapshot: Optional[tuple] = ()
+
+    @property
+    def observers(self) -> List[object]:
+        if not self.weak:
+            return list(self._observers)
+        return [obs for obs in (ref() for ref in list(self._observers)) if obs is not None]
 
     def add(self, observer: object) -> None:
-        if observer not in self.observers:
-            self.observers.append(observer)
+        key = weakref.ref(observer, self._discard) if self.weak else observer
+        if key not in self._observers:
+            self._observers[key] = None
+            self._snapshot = None
         else:
             logger.info(f"Observer {observer} is already exist")
 
     def remove(self, observer: object) -> None:
         try:
-            self.observers.remove(observer)
-        except ValueError:
+            del self._observers[weakref.ref(observer) if self.weak else observer]
+            self._snapshot = None
+        except KeyError:
             logger.error(f"Observer {observer} does not exist")
+            return None
+        if self.dispatcher is not None:
+            self.dispatcher.forget(observer)
+
+    def _discard(self, ref: weakref.ref) -> None:
+        self._observers.pop(ref, None)
+        self._snapshot = None
+
+    def notify(self) -> None:
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._snapshot = tuple(self._observers)
+        if self.dispatcher is not None:
+            if self.weak:
+                snapshot = tuple(obs for obs in (ref() for ref in snapshot) if obs is not None)
+            self.dispatcher.dispatch(self, snapshot)
+        elif self.weak:
+            for ref in snapshot:
+                obs = ref()
+                if obs is not None:
+                    obs.notify(self)
+        else:
+            for obs in snapshot:
+                obs.notify(self)
+
+
+class ListPublisher:
+    """Previous list based Publisher, kept as the baseline of benchmark_publisher()"""
+
+    def __init__(self) -> None:
+        self.observers = []
+
+    def add(self, observer: object) -> None:
+        if observer not in self.observers:
+            self.observers.append(observer)
+
+    def remove(self, observer: object) -> None:
+        self.observers.remove(observer)
 
     def notify(self) -> None:
         [obs.notify(self) for obs in self.observers]
 
 
+class CountingObserver:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def notify(self, publisher) -> None:
+        self.count += 1
+
+
+def benchmark_publisher(observers: int = 10 ** 4, events: int = 10 ** 6, fan_out: int = 10) -> None:
+    """Subscribe/unsubscribe churn with many observers and notify rate for many events"""
+    for publisher_class in (ListPublisher, Publisher):
+        subscribers = [CountingObserver() for _ in range(observers)]
+        publisher = publisher_class()
+        start = time.perf_counter()
+        for obs in subscribers:
+            publisher.add(obs)
+        for obs in subscribers:
+            publisher.remove(obs)
+        churn = time.perf_counter() - start
+
+        for obs in subscribers[:fan_out]:
+            publisher.add(obs)
+        start = time.perf_counter()
+        for _ in range(events):
+            publisher.notify()
+        rate = events / (time.perf_counter() - start)
+        print(f"{publisher_class.__name__}: add+remove {observers} observers {churn:.3f}s, "
+              f"{rate:,.0f} events/s to {fan_out} observers")
+
+
+class _TopicNode:
+    __slots__ = ("children", "subscribers")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_TopicNode"] = {}
+        self.subscribers: Dict[Any, Optional[Callable[[Any], bool]]] = {}
+
+
+class TopicPublisher:
+    """Publish/subscribe by topic, observers are notified with notify(publisher, topic, message)
+
+    --> Topics are dot separated ("sensor.temp.kitchen"). In a pattern "*" matches exactly one segment and
+        a trailing "#" matches any number of remaining segments, including none
+    --> Exact topics live in a dict and patterns in a trie of segments, so publishing only visits
+        the subscriptions that can match instead of every observer
+    --> An optional predicate(message) filters messages further, an observer matched by several
+        subscriptions is notified once
+    """
+
+    def __init__(self) -> None:
+        self._exact: Dict[str, Dict[Any, Optional[Callable[[Any], bool]]]] = {}
+        self._patterns = _TopicNode()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @staticmethod
+    def _is_pattern(topic: str) -> bool:
+        return "*" in topic or "#" in topic
+
+    def subscribe(self, topic: str, observer: Any, predicate: Optional[Callable[[Any], bool]] = None) -> None:
+        if self._is_pattern(topic):
+            segments = topic.split(".")
+            if "#" in segments[:-1]:
+                raise ValueError(f"'#' is only allowed as last segment: {topic}")
+            node = self._patterns
+            for segment in segments:
+                node = node.children.setdefault(segment, _TopicNode())
+            subscribers = node.subscribers
+        else:
+            subscribers = self._exact.setdefault(topic, {})
+        if observer not in subscribers:
+            self._count += 1
+        subscribers[observer] = predicate
+
+    def unsubscribe(self, topic: str, observer: Any) -> None:
+        if not self._is_pattern(topic):
+            subscribers = self._exact.get(topic, {})
+            if subscribers.pop(observer, _MISSING) is _MISSING:
+                logger.error(f"Observer {observer} is not subscribed to {topic}")
+                return None
+            if not subscribers:
+                del self._exact[topic]
+            self._count -= 1
+            return None
+        segments = topic.split(".")
+        path = [self._patterns]
+        for segment in segments:
+            node = path[-1].children.get(segment)
+            if node is None:
+                break
+            path.append(node)
+        else:
+            if path[-1].subscribers.pop(observer, _MISSING) is not _MISSING:
+                self._count -= 1
+                for depth in range(len(segments), 0, -1):
+                    if path[depth].children or path[depth].subscribers:
+                        break
+                    del path[depth - 1].children[segments[depth - 1]]
+                return None
+        logger.error(f"Observer {observer} is not subscribed to {topic}")
+
+    def subscribers(self, topic: str) -> Dict[Any, List[Optional[Callable[[Any], bool]]]]:
+        """Observers whose subscriptions match topic, with their predicates"""
+        matched: Dict[Any, List[Optional[Callable[[Any], bool]]]] = {}
+        for observer, predicate in self._exact.get(topic, {}).items():
+            matched.setdefault(observer, []).append(predicate)
+        segments = topic.split(".")
+        stack = [(self._patterns, 0)]
+        while stack:
+            node, depth = stack.pop()
+            rest = node.children.get("#")
+            if rest is not None:
+                for observer, predicate in rest.subscribers.items():
+                    matched.setdefault(observer, []).append(predicate)
+            if depth == len(segments):
+                for observer, predicate in node.subscribers.items():
+                    matched.setdefault(observer, []).append(predicate)
+                continue
+            for key in (segments[depth], "*"):
+                child = node.children.get(key)
+                if child is not None:
+                    stack.append((child, depth + 1))
+        return matched
+
+    def publish(self, topic: str, message: Any = None) -> int:
+        """Notify matching observers and return how many were notified"""
+        notified = 0
+        for observer, predicates in self.subscribers(topic).items():
+            if any(predicate is None or predicate(message) for predicate in predicates):
+                observer.notify(self, topic, message)
+                notified += 1
+        return notified
+
+
+class TopicCounter:
+    def __init__(self, topic: Optional[str] = None) -> None:
+        self.topic = topic
+        self.count = 0
+
+    def notify(self, publisher, topic: Optional[str] = None, message: Any = None) -> None:
+        if self.topic is None or topic == self.topic:
+            self.count += 1
+
+
+def benchmark_topics(subscriptions: int = 10 ** 5, topics: int = 1000, events: int = 10 ** 4) -> None:
+    """Indexed topic publishing against broadcasting to every observer and filtering in the observer"""
+    rnd = random.Random(3)
+    names = [f"region{i % 10}.sensor{i}" for i in range(topics)]
+    observers = [TopicCounter(rnd.choice(names)) for _ in range(subscriptions)]
+
+    topic_publisher = TopicPublisher()
+    for obs in observers:
+        topic_publisher.subscribe(obs.topic, obs)
+    for region in range(10):
+        topic_publisher.subscribe(f"region{region}.*", TopicCounter())
+    broadcast = Publisher()
+    for obs in observers:
+        broadcast.add(obs)
+
+    published = [rnd.choice(names) for _ in range(events)]
+    start = time.perf_counter()
+    for topic in published:
+        topic_publisher.publish(topic)
+    indexed = time.perf_counter() - start
+
+    sample = published[:max(1, events // 100)]
+    start = time.perf_counter()
+    for topic in sample:
+        for obs in broadcast.observers:
+            obs.notify(broadcast, topic)
+    scanned = (time.perf_counter() - start) / len(sample) * events
+    print(f"{subscriptions} subscriptions over {topics} topics, {events} events: "
+          f"indexed {indexed:.3f}s, broadcast and filter {scanned:.3f}s (extrapolated)")
+
+
 class DefaultFormatter(Publisher):
-    def __init__(self, name):
-        Publisher.__init__(self)
+    """Publisher of an int value, every assignment to data notifies observers unless coalesced
+
+    --> Inside "with formatter.batch():" writes are collected and observers get one notification on exit
+    --> throttle=seconds notifies at most once per interval, debounce=seconds only after writes stop for that long.
+        The trailing notification is sent from a timer thread.
+    --> Notifications always carry the latest value, with keep_history=True every value written since the
+        previous notification is available to observers as publisher.batch_values
+    --> skip_unchanged=True ignores writes of the current value and skips notifications that would repeat
+        the last notified value
+    --> view(name) returns a derived value (hex, bin or any transform added with register_view) computed at most
+        once per data version and shared by every observer
+    """
+
+    def __init__(self, name, weak: bool = False, dispatcher: Optional[Dispatcher] = None,
+                 skip_unchanged: bool = False, throttle: Optional[float] = None, debounce: Optional[float] = None,
+                 keep_history: bool = False):
+        Publisher.__init__(self, weak=weak, dispatcher=dispatcher)
         self.name = name
         self._data = 0
+        self.version = 0
+        self._views: Dict[str, Callable[[int], Any]] = {"hex": hex, "bin": bin}
+        self._view_cache: Dict[str, tuple] = {}
+        self.skip_unchanged = skip_unchanged
+        self.throttle = throttle
+        self.debounce = debounce
+        self.keep_history = keep_history
+        self.batch_values: List[int] = []
+        self._pending_values: List[int] = []
+        self._batch_depth = 0
+        self._dirty = False
+        self._last_flush = float("-inf")
+        self._last_notified = self._data
+        self._timer: Optional[threading.Timer] = None
+        self._deadline = 0.0
+        self._lock = threading.RLock()
 
     @property
     def data(self) -> int:
@@ -53,11 +596,100 @@ class DefaultFormatter(Publisher):
     @data.setter
     def data(self, value: int) -> None:
         try:
-            self._data = int(value)
+            value = int(value)
         except ValueError:
             logger.error("Invalid data value type. Must be int value")
-        else:
-            self.notify()
+            return None
+        with self._lock:
+            if self.skip_unchanged and value == self._data:
+                return None
+            self._data = value
+            self.version += 1
+            if self.keep_history:
+                self._pending_values.append(value)
+            self._dirty = True
+            if self._batch_depth:
+                return None
+            if self.debounce is not None:
+                self._schedule(self.debounce)
+                return None
+            if self.throttle is not None:
+                wait = self._last_flush + self.throttle - time.monotonic()
+                if wait > 0:
+                    if self._timer is None:
+                        self._schedule(wait)
+                    return None
+        self.flush()
+
+    def register_view(self, name: str, transform: Callable[[int], Any]) -> None:
+        self._views[name] = transform
+        self._view_cache.pop(name, None)
+
+    def view(self, name: str) -> Any:
+        return self.view_at(name, self.version, self._data)
+
+    def view_at(self, name: str, version: int, data: int) -> Any:
+        """View of data written at version, queued notifications ask for the version they carry"""
+        cached = self._view_cache.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        value = self._views[name](data)
+        if version == self.version:
+            self._view_cache[name] = (version, value)
+        return value
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator["DefaultFormatter"]:
+        """Collapse every write done in the block into a single notification"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                done = not self._batch_depth
+            if done:
+                self.flush()
+
+    def _schedule(self, delay: float) -> None:
+        """Move the trailing notification to delay seconds from now, one timer thread serves every move"""
+        self._deadline = time.monotonic() + delay
+        if self._timer is None:
+            self._start_timer(delay)
+
+    def _start_timer(self, delay: float) -> None:
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            if threading.current_thread() is not self._timer:
+                return None  # replaced or cancelled by flush()
+            remaining = self._deadline - time.monotonic()
+            if remaining > 0:
+                # writes moved the deadline while this timer slept
+                self._start_timer(remaining)
+                return None
+        self.flush()
+
+    def flush(self) -> None:
+        """Send the pending notification now, if there is one"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return None
+            self._dirty = False
+            self._last_flush = time.monotonic()
+            values, self._pending_values = self._pending_values, []
+            if self.skip_unchanged and self._data == self._last_notified:
+                return None
+            self._last_notified = self._data
+        self.batch_values = values
+        self.notify()
 
     def __str__(self) -> str:
         return f"{type(self).__name__}: {self.name} has data {self._data}"
@@ -65,14 +697,14 @@ class DefaultFormatter(Publisher):
 
 class HexFormatterObs:
     def notify(self, publisher) -> None:
-        value = hex(publisher.data)
-        logger.info(f"{type(self).__name__}: {publisher.name} has data {value}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("%s: %s has data %s", type(self).__name__, publisher.name, publisher.view("hex"))
 
 
 class BinaryFormatterObs:
     def notify(self, publisher) -> None:
-        value = bin(publisher.data)
-        logger.info(f"{type(self).__name__}: {publisher.name} has data {value}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("%s: %s has data %s", type(self).__name__, publisher.name, publisher.view("bin"))
 
 
 def main():
@@ -93,5 +725,14 @@ def main():
     df.data = "Hello"
 
 
+def benchmark():
+    """Publisher and topic benchmarks, run with --benchmark"""
+    benchmark_publisher()
+    benchmark_topics()
+
+
 if __name__ == '__main__':
-    main()
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        main()
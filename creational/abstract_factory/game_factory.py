@@ -9,8 +9,14 @@ When to use abstract factory design pattern?
 -> If we find out that our application requires many factory methods, which make sense to combine to create a family
     of objects, we end up with abstract factory.
 """
+import sys
+import time
 from abc import ABC, abstractmethod
-from typing import Optional, Union
+from array import array
+from collections import Counter, namedtuple
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+
+Interaction = namedtuple("Interaction", ["hero", "obstacle", "action"])
 
 
 class Obstacle:
@@ -31,15 +37,48 @@ class Game:
     def __init__(self, name: str) -> None:
         self.name = name
 
+    def interaction(self, obstacle: Obstacle) -> Interaction:
+        return Interaction(self.__class__.__name__, str(obstacle), obstacle.action())
+
     def interact_with(self, obstacle: Obstacle):
-        act = obstacle.action()
-        print(f"{self.__class__.__name__} encountered obstacle: {obstacle} and act {act}")
+        hero, obstacle_name, act = self.interaction(obstacle)
+        print(f"{hero} encountered obstacle: {obstacle_name} and act {act}")
+
+
+class ObjectPool:
+    """Free lists of released Game/Obstacle objects that are re-initialized instead of allocated again"""
+
+    def __init__(self, max_free: int = 1024) -> None:
+        self.max_free = max_free
+        self._free: Dict[type, List[Any]] = {}
+
+    def acquire(self, cls: Type, *args, **kwargs) -> Any:
+        free = self._free.get(cls)
+        if free:
+            try:
+                obj = free.pop()
+            except IndexError:
+                return cls(*args, **kwargs)
+            obj.__init__(*args, **kwargs)
+            return obj
+        return cls(*args, **kwargs)
+
+    def release(self, obj: Any) -> None:
+        free = self._free.setdefault(type(obj), [])
+        if len(free) < self.max_free:
+            free.append(obj)
 
 
 class GameWorld(ABC):
 
-    def __init__(self, name: str) -> None:
+    def __init__(self, name: str, pool: Optional[ObjectPool] = None) -> None:
         self.player_name = name
+        self.pool = pool
+
+    def _make(self, cls: Type, *args, **kwargs) -> Any:
+        if self.pool is None:
+            return cls(*args, **kwargs)
+        return self.pool.acquire(cls, *args, **kwargs)
 
     def __str__(self) -> str:
         return f"\n---------------------{self.__class__.__name__}--------------\n"
@@ -64,23 +103,27 @@ class Bug(Obstacle):
 class FrogWorld(GameWorld):
 
     def make_character(self) -> Frog:
-        return Frog(self.player_name)
+        return self._make(Frog, self.player_name)
 
     def make_obstacle(self) -> Bug:
-        return Bug(name="a bug", action="eats it")
+        return self._make(Bug, name="a bug", action="eats it")
+
+
+class Wizard(Game):
+    pass
+
+
+class Ork(Obstacle):
+    pass
 
 
 class WizardWorld(GameWorld):
 
-    def make_character(self):
-        class Wizard(Game):
-            pass
-        return Wizard(self.player_name)
+    def make_character(self) -> Wizard:
+        return self._make(Wizard, self.player_name)
 
-    def make_obstacle(self):
-        class Ork(Obstacle):
-            pass
-        return Ork(name="a Ork", action="Kills it")
+    def make_obstacle(self) -> Ork:
+        return self._make(Ork, name="a Ork", action="Kills it")
 
 
 class Army(Game):
@@ -92,22 +135,132 @@ class Shoots(Obstacle):
 
 
 class ArmyWorld(GameWorld):
-    def make_character(self):
-        return Army(name="The army")
+    def make_character(self) -> Army:
+        return self._make(Army, name="The army")
 
-    def make_obstacle(self):
-        return Shoots(name="a enemy", action="Shoots")
+    def make_obstacle(self) -> Shoots:
+        return self._make(Shoots, name="a enemy", action="Shoots")
+
+
+class GameWorldRegistry:
+    """Long-lived world factories, one per (world class, player name), optionally sharing one ObjectPool
+
+    -> Game and Obstacle objects are tiny, CPython allocates them about as fast as the pool recycles them,
+       so pooling is opt-in and mostly useful when those objects get expensive to build
+    """
+
+    def __init__(self, pool: Optional[ObjectPool] = None) -> None:
+        self.pool = pool
+        self._worlds: Dict[Tuple[type, str], GameWorld] = {}
+
+    def get(self, world_cls: Type[GameWorld], name: str) -> GameWorld:
+        world = self._worlds.get((world_cls, name))
+        if world is None:
+            world = self._worlds.setdefault((world_cls, name), world_cls(name, pool=self.pool))
+        return world
+
+
+world_registry = GameWorldRegistry()
 
 
 class GameEnvironment:
 
     def __init__(self, factory: Union[FrogWorld, WizardWorld, ArmyWorld]) -> None:
+        self.factory = factory
         self.hero = factory.make_character()
         self.obstacle = factory.make_obstacle()
 
     def play(self) -> None:
         self.hero.interact_with(self.obstacle)
 
+    def outcome(self) -> Interaction:
+        """Result of play() without printing it, the reference SimulationEngine is checked against"""
+        return self.hero.interaction(self.obstacle)
+
+    def release(self) -> None:
+        """Give hero and obstacle back to the world pool, the environment must not be played again"""
+        if self.factory.pool is not None:
+            self.factory.pool.release(self.hero)
+            self.factory.pool.release(self.obstacle)
+        self.hero = self.obstacle = None
+
+
+SimulationResult = namedtuple("SimulationResult", ["sessions", "ticks", "interactions"])
+
+
+class SimulationEngine:
+    """Runs many GameEnvironment sessions in tick based batches
+
+    -> The game is stateless: hero and obstacle keep no state between encounters and the outcome only depends on
+       the world type. run() therefore plays one GameEnvironment per world type and counts its outcome
+       sessions * ticks times in closed form, instead of stepping through ticks or sessions
+    -> Sessions of one world type share a compact array holding the tick each session joined at,
+       a session's encounter count is derived from it
+    -> Interactions are aggregated in memory as a Counter of Interaction -> number of encounters
+    """
+
+    def __init__(self, player_name: str = "player") -> None:
+        self.player_name = player_name
+        self.tick_count = 0
+        self.worlds: Dict[Type[GameWorld], GameWorld] = {}
+        self.joined: Dict[Type[GameWorld], array] = {}
+        self.interactions: Counter = Counter()
+
+    def add_sessions(self, world_cls: Type[GameWorld], count: int) -> None:
+        if world_cls not in self.worlds:
+            self.worlds[world_cls] = world_cls(self.player_name)
+            self.joined[world_cls] = array("L")
+        self.joined[world_cls].extend([self.tick_count] * count)
+
+    def encounters(self, world_cls: Type[GameWorld]) -> List[int]:
+        """Encounters played so far by every session of world_cls"""
+        return [self.tick_count - joined for joined in self.joined[world_cls]]
+
+    def run(self, ticks: int) -> SimulationResult:
+        for world_cls, world in self.worlds.items():
+            sessions = len(self.joined[world_cls])
+            if sessions and ticks > 0:
+                self.interactions[GameEnvironment(world).outcome()] += sessions * ticks
+        self.tick_count += max(ticks, 0)
+        sessions = sum(len(joined) for joined in self.joined.values())
+        return SimulationResult(sessions, self.tick_count, self.interactions)
+
+
+def simulate(sessions: Dict[Type[GameWorld], int], ticks: int) -> SimulationResult:
+    """Interactions of sessions[world_cls] sessions of every world type playing ticks encounters each"""
+    engine = SimulationEngine()
+    for world_cls, count in sessions.items():
+        engine.add_sessions(world_cls, count)
+    return engine.run(ticks)
+
+
+def reference_simulation(sessions: Dict[Type[GameWorld], int], ticks: int) -> Counter:
+    """Plays every session on every tick through GameEnvironment, one object at a time"""
+    interactions: Counter = Counter()
+    for world_cls, count in sessions.items():
+        for _ in range(count):
+            game = GameEnvironment(world_cls("player"))
+            for _ in range(ticks):
+                interactions[game.outcome()] += 1
+    return interactions
+
+
+def benchmark_simulation(sessions: int = 10 ** 6, ticks: int = 100) -> None:
+    per_world = {FrogWorld: sessions // 3, WizardWorld: sessions // 3, ArmyWorld: sessions - 2 * (sessions // 3)}
+    small = {world_cls: max(count // 1000, 1) for world_cls, count in per_world.items()}
+    start = time.perf_counter()
+    expected = reference_simulation(small, ticks)
+    # seconds the reference would need for every session
+    reference = (time.perf_counter() - start) * sum(per_world.values()) / sum(small.values())
+    if simulate(small, ticks).interactions != expected:
+        raise RuntimeError("SimulationEngine interactions differ from the GameEnvironment reference")
+
+    start = time.perf_counter()
+    result = simulate(per_world, ticks)
+    batched = time.perf_counter() - start
+    print(f"{result.sessions} sessions x {result.ticks} ticks: closed form {batched * 1000:.2f}ms, "
+          f"one object at a time ~{reference:.0f}s (extrapolated from {sum(small.values())} sessions)")
+
 
 def main():
     username = input("Hi, what is your name?")
@@ -122,5 +275,13 @@ def main():
     print(f"Finished playing {game_type.__name__} game.\n")
 
 
+def benchmark():
+    """Closed form simulation against the per object reference, run with --benchmark"""
+    benchmark_simulation()
+
+
 if __name__ == '__main__':
-    main()
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        main()
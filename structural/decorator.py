@@ -13,54 +13,664 @@ Decorator design pattern
     6. Business rules
     7. Encryption
 """
+import os
+import sys
+import asyncio
+import inspect
 import time
+import pickle
 import logging
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict, namedtuple
 from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def fib_cache(func) -> object:
-    cache = dict()
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize", "nbytes"])
 
-    @wraps(func)
-    def wrapper(*args, **kwargs) -> int:
-        if args not in cache:
-            cache[args] = func(*args, **kwargs)
-        return cache[args]
+_MISSING = object()
 
-    return wrapper
+
+class _KwdMark:
+    """Separates positional from keyword arguments in cache keys, a class so it stays equal after pickling"""
+
+
+_KWD_MARK = _KwdMark
+_FAST_TYPES = {int, str}
+
+
+def _make_key(args: tuple, kwargs: dict, typed: bool = False) -> Hashable:
+    """Build a flat hashable key from positional and keyword arguments.
+
+    Keyword arguments are sorted so that f(a=1, b=2) and f(b=2, a=1) share one entry.
+    """
+    key = args
+    if kwargs:
+        key += (_KWD_MARK,) + tuple(sorted(kwargs.items()))
+    if typed:
+        key += tuple(type(v) for v in args)
+        if kwargs:
+            key += tuple(type(v) for _, v in sorted(kwargs.items()))
+    elif len(key) == 1 and type(key[0]) in _FAST_TYPES:
+        return key[0]
+    return key
+
+
+class MemoCache:
+    """Bounded in-memory store with LRU and TTL eviction.
+
+    -> Entry count is bounded by maxsize and approximate size (sys.getsizeof of key and value) by maxbytes
+    -> Reads never block: a hit only tries to grab the lock for refreshing LRU order and skips it when contended.
+       Hit and miss counters are therefore approximate under heavy thread contention.
+    -> Writes and evictions are serialized by a single lock
+    """
+
+    def __init__(self, maxsize: Optional[int] = 128, ttl: Optional[float] = None,
+                 maxbytes: Optional[int] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            self.misses += 1
+            return default
+        if self._lock.acquire(blocking=False):
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                pass
+            finally:
+                self._lock.release()
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if self.maxsize == 0 or (self.maxbytes is not None and size > self.maxbytes):
+            return None
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[2]
+            self._data[key] = (value, expires, size)
+            self.nbytes += size
+            self._evict()
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[2]
+
+    def expire(self) -> int:
+        """Drop all expired entries and return how many were removed"""
+        if self.ttl is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            stale = [key for key, entry in self._data.items() if entry[1] <= now]
+            for key in stale:
+                self.nbytes -= self._data.pop(key)[2]
+        return len(stale)
+
+    def _evict(self) -> None:
+        data = self._data
+        while data and ((self.maxsize is not None and len(data) > self.maxsize)
+                        or (self.maxbytes is not None and self.nbytes > self.maxbytes)):
+            _, entry = data.popitem(last=False)
+            self.nbytes -= entry[2]
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data), self.nbytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.nbytes = 0
+
+
+class SqliteCache:
+    """Disk backed cache shared by every process on the host that opens the same file
+
+    -> Entries live in one sqlite table in WAL mode, every write and eviction runs in a single IMMEDIATE transaction
+    -> Least recently used rows of the namespace are evicted once maxsize entries or maxbytes are exceeded
+    -> Values go through serializer (any object with dumps/loads, pickle by default), keys are always pickled
+    -> warm_start preloads that many of the most used keys into an in-process MemoCache at construction time
+    -> Hits are buffered and written back in batches so reads don't take the database write lock
+    """
+
+    TOUCH_BATCH = 64
+
+    def __init__(self, path: str, namespace: str = "default", maxsize: Optional[int] = None,
+                 ttl: Optional[float] = None, maxbytes: Optional[int] = None, serializer: Any = pickle,
+                 warm_start: int = 0) -> None:
+        self.path = path
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.serializer = serializer
+        self.warm_start = warm_start
+        self.hits = 0
+        self.misses = 0
+        self.front = MemoCache(maxsize=warm_start, ttl=ttl) if warm_start else None
+        self._touched: Dict[bytes, int] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS memo (namespace TEXT NOT NULL, key BLOB NOT NULL, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, hits INTEGER NOT NULL DEFAULT 0, accessed REAL NOT NULL, expires REAL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS memo_lru ON memo (namespace, accessed)")
+        self._connection().execute("CREATE INDEX IF NOT EXISTS memo_expires ON memo (namespace, expires)")
+        self._create_totals()
+        if warm_start:
+            self.preload(warm_start)
+
+    def with_namespace(self, namespace: str) -> "SqliteCache":
+        """Same database and settings under another namespace"""
+        return SqliteCache(self.path, namespace, self.maxsize, self.ttl, self.maxbytes, self.serializer,
+                           self.warm_start)
+
+    def _create_totals(self) -> None:
+        """Running entry count and bytes per namespace, kept up to date by triggers in the writing transaction"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'memo_meta'").fetchone()
+            if not exists:
+                conn.execute("CREATE TABLE memo_meta (namespace TEXT PRIMARY KEY, count INTEGER NOT NULL, "
+                             "nbytes INTEGER NOT NULL)")
+                conn.execute("INSERT INTO memo_meta SELECT namespace, COUNT(*), SUM(size) FROM memo GROUP BY namespace")
+                conn.execute(
+                    "CREATE TRIGGER memo_meta_insert AFTER INSERT ON memo BEGIN "
+                    "INSERT INTO memo_meta (namespace, count, nbytes) VALUES (NEW.namespace, 1, NEW.size) "
+                    "ON CONFLICT (namespace) DO UPDATE SET count = count + 1, nbytes = nbytes + NEW.size; END"
+                )
+                conn.execute(
+                    "CREATE TRIGGER memo_meta_delete AFTER DELETE ON memo BEGIN "
+                    "UPDATE memo_meta SET count = count - 1, nbytes = nbytes - OLD.size "
+                    "WHERE namespace = OLD.namespace; END"
+                )
+                conn.execute(
+                    "CREATE TRIGGER memo_meta_update AFTER UPDATE OF size ON memo BEGIN "
+                    "UPDATE memo_meta SET nbytes = nbytes - OLD.size + NEW.size WHERE namespace = NEW.namespace; END"
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _totals(self, conn: sqlite3.Connection) -> Tuple[int, int]:
+        row = conn.execute("SELECT count, nbytes FROM memo_meta WHERE namespace = ?", (self.namespace,)).fetchone()
+        return row if row is not None else (0, 0)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # rows replaced by INSERT OR REPLACE only fire the delete trigger with recursive triggers on
+            conn.execute("PRAGMA recursive_triggers=ON")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def _dump_key(key: Hashable) -> bytes:
+        return pickle.dumps(key, protocol=4)
+
+    def preload(self, count: int) -> int:
+        """Load the count most hit keys of the namespace into the in-process front cache"""
+        if self.front is None:
+            self.front = MemoCache(maxsize=count, ttl=self.ttl)
+        rows = self._connection().execute(
+            "SELECT key, value FROM memo WHERE namespace = ? AND (expires IS NULL OR expires > ?) "
+            "ORDER BY hits DESC LIMIT ?", (self.namespace, time.time(), count)
+        ).fetchall()
+        for key, value in reversed(rows):
+            self.front.set(pickle.loads(key), self.serializer.loads(value))
+        return len(rows)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if self.front is not None:
+            value = self.front.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+        raw_key = self._dump_key(key)
+        row = self._connection().execute(
+            "SELECT value FROM memo WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+            (self.namespace, raw_key, time.time())
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        with self._lock:
+            self._touched[raw_key] = self._touched.get(raw_key, 0) + 1
+            flush = len(self._touched) >= self.TOUCH_BATCH
+        if flush:
+            self.flush()
+        value = self.serializer.loads(row[0])
+        if self.front is not None:
+            self.front.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        raw_key, raw_value = self._dump_key(key), self.serializer.dumps(value)
+        size = len(raw_key) + len(raw_value)
+        if self.maxbytes is not None and size > self.maxbytes:
+            return None
+        now = time.time()
+        expires = now + self.ttl if self.ttl is not None else None
+        self.flush()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO memo (namespace, key, value, size, hits, accessed, expires) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?)", (self.namespace, raw_key, raw_value, size, now, expires)
+            )
+            self._evict(conn, now)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        if self.front is not None:
+            self.front.set(key, value)
+
+    def delete(self, key: Hashable) -> None:
+        self._connection().execute("DELETE FROM memo WHERE namespace = ? AND key = ?",
+                                   (self.namespace, self._dump_key(key)))
+        if self.front is not None:
+            self.front.delete(key)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM memo WHERE namespace = ? AND expires <= ?", (self.namespace, now))
+        if self.maxsize is None and self.maxbytes is None:
+            return None
+        count, nbytes = self._totals(conn)
+        if self.maxsize is not None and count > self.maxsize:
+            conn.execute(
+                "DELETE FROM memo WHERE namespace = ? AND key IN "
+                "(SELECT key FROM memo WHERE namespace = ? ORDER BY accessed LIMIT ?)",
+                (self.namespace, self.namespace, count - self.maxsize)
+            )
+            count, nbytes = self._totals(conn)
+        if self.maxbytes is None or nbytes <= self.maxbytes:
+            return None
+        stale = []
+        rows = conn.execute("SELECT key, size FROM memo WHERE namespace = ? ORDER BY accessed", (self.namespace,))
+        for key, size in rows:
+            if nbytes <= self.maxbytes:
+                break
+            stale.append((self.namespace, key))
+            nbytes -= size
+        rows.close()
+        conn.executemany("DELETE FROM memo WHERE namespace = ? AND key = ?", stale)
+
+    def flush(self) -> None:
+        """Write buffered hit counts and access times back to the database"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            now = time.time()
+            self._connection().executemany(
+                "UPDATE memo SET hits = hits + ?, accessed = ? WHERE namespace = ? AND key = ?",
+                [(hits, now, self.namespace, key) for key, hits in touched.items()]
+            )
+
+    def info(self) -> CacheInfo:
+        count, nbytes = self._totals(self._connection())
+        return CacheInfo(self.hits, self.misses, self.maxsize, count, nbytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._touched.clear()
+        self._connection().execute("DELETE FROM memo WHERE namespace = ?", (self.namespace,))
+        if self.front is not None:
+            self.front.clear()
+        self.hits = self.misses = 0
+
+
+class _Flight:
+    """One in-flight computation that concurrent callers of the same key wait on"""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def memoize(maxsize: Optional[int] = 128, ttl: Optional[float] = None, maxbytes: Optional[int] = None,
+            typed: bool = False, cache: Optional[Union[MemoCache, SqliteCache]] = None,
+            single_flight: bool = True) -> Callable:
+    """Caching decorator backed by MemoCache, or by the given cache backend (e.g. SqliteCache)
+
+    -> Coroutine functions are detected and their awaited results are cached, not the coroutine objects
+    -> With single_flight, concurrent misses for the same key (threads or asyncio tasks) share one computation
+       and failures are raised to every waiter without being cached
+    -> A cache passed in may be shared by several functions: a SqliteCache gets a namespace of its own per
+       function, other backends get the function name in every key
+
+    >>> @memoize(maxsize=2)
+    ... def square(x):
+    ...     return x * x
+    >>> square(3), square(3), square(x=3)
+    (9, 9, 9)
+    >>> square.cache_info()  # doctest: +ELLIPSIS
+    CacheInfo(hits=1, misses=2, maxsize=2, currsize=2, nbytes=...)
+    """
+    if callable(maxsize):
+        return memoize()(maxsize)
+
+    def decorator(func: Callable) -> Callable:
+        scope = None
+        if cache is None:
+            store = MemoCache(maxsize=maxsize, ttl=ttl, maxbytes=maxbytes)
+        elif isinstance(cache, SqliteCache):
+            store = cache.with_namespace(f"{cache.namespace}/{func.__module__}.{func.__qualname__}")
+        else:
+            store, scope = cache, f"{func.__module__}.{func.__qualname__}"
+
+        def make_key(args: tuple, kwargs: dict) -> Hashable:
+            key = _make_key(args, kwargs, typed)
+            return key if scope is None else (scope, key)
+
+        flights: Dict[Hashable, Any] = {}
+        flights_lock = threading.Lock()
+
+        def compute(key: Hashable, args: tuple, kwargs: dict) -> Any:
+            with flights_lock:
+                flight = flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = flights[key] = _Flight()
+            if not leader:
+                flight.event.wait()
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            try:
+                flight.value = func(*args, **kwargs)
+                store.set(key, flight.value)
+                return flight.value
+            except BaseException as exc:
+                flight.error = exc
+                raise
+            finally:
+                with flights_lock:
+                    del flights[key]
+                flight.event.set()
+
+        if inspect.iscoroutinefunction(func):
+            async def fill(key: Hashable, args: tuple, kwargs: dict) -> Any:
+                value = await func(*args, **kwargs)
+                store.set(key, value)
+                return value
+
+            @wraps(func)
+            async def wrapper(*args, **kwargs) -> Any:
+                key = make_key(args, kwargs)
+                value = store.get(key, _MISSING)
+                if value is not _MISSING:
+                    return value
+                if not single_flight:
+                    return await fill(key, args, kwargs)
+                loop = asyncio.get_running_loop()
+                flight_key = (loop, key)
+                task = flights.get(flight_key)
+                if task is None:
+                    task = flights[flight_key] = loop.create_task(fill(key, args, kwargs))
+                    task.add_done_callback(lambda _: flights.pop(flight_key, None))
+                return await asyncio.shield(task)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs) -> Any:
+                key = make_key(args, kwargs)
+                value = store.get(key, _MISSING)
+                if value is not _MISSING:
+                    return value
+                if single_flight:
+                    return compute(key, args, kwargs)
+                value = func(*args, **kwargs)
+                store.set(key, value)
+                return value
+
+        wrapper.cache = store
+        wrapper.cache_info = store.info
+        wrapper.cache_clear = store.clear
+        return wrapper
+
+    return decorator
+
+
+def fib_cache(func) -> object:
+    """Kept for backward compatibility, bounded memoize() with default settings"""
+    return memoize()(func)
 
 
 def fib_logger(func) -> object:
     @wraps(func)
     def wrapper(*args, **kwargs) -> int:
-        logger.info(f"Logging info: {args}, kwargs: {kwargs}")
-        logger.info(f"Calling: {func.__name__}")
+        if not logger.isEnabledFor(logging.INFO):
+            return func(*args, **kwargs)
+        logger.info("Logging info: %s, kwargs: %s", args, kwargs)
+        logger.info("Calling: %s", func.__name__)
         resp = func(*args, **kwargs)
-        logger.info(f"Function resp is: {resp}")
+        logger.info("Function resp is: %s", resp)
         return resp
 
     return wrapper
 
 
-@fib_logger
-@fib_cache
-def fibonacci(number) -> int:
+class CallStats:
+    """Call counters and a log2 latency histogram for one instrumented function
+
+    -> Bucket i counts calls that took less than 2 ** i nanoseconds, buckets are preallocated once
+    -> Percentiles are read from the histogram, so they are upper bounds with a 2x resolution
+    -> Counters are updated without a lock, they may slightly under count under thread contention
+    """
+
+    BUCKETS = 64
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.enabled = True
+        self.calls = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.histogram = array("Q", [0]) * self.BUCKETS
+
+    def record(self, elapsed_ns: int) -> int:
+        """Count one call that took elapsed_ns and return the number of calls so far"""
+        calls = self.calls = self.calls + 1
+        self.total_ns += elapsed_ns
+        bucket = elapsed_ns.bit_length()
+        self.histogram[bucket if bucket < self.BUCKETS else self.BUCKETS - 1] += 1
+        return calls
+
+    def percentile(self, q: float) -> int:
+        total = sum(self.histogram)
+        if not total:
+            return 0
+        target = total * q / 100
+        running = 0
+        for bucket, count in enumerate(self.histogram):
+            running += count
+            if count and running >= target:
+                return 1 << bucket
+        return 1 << (self.BUCKETS - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ns": self.total_ns,
+            "p50_ns": self.percentile(50),
+            "p95_ns": self.percentile(95),
+            "p99_ns": self.percentile(99),
+        }
+
+    def reset(self) -> None:
+        self.calls = self.errors = self.total_ns = 0
+        for bucket in range(self.BUCKETS):
+            self.histogram[bucket] = 0
+
+
+_instruments: Dict[str, CallStats] = {}
+
+
+def instrument(name: Optional[str] = None, level: int = logging.DEBUG, sample_rate: int = 1,
+               log: logging.Logger = logger) -> Callable:
+    """Hot path instrumentation decorator
+
+    -> Every call is counted and timed into CallStats, readable with instrumentation_snapshot()
+    -> Only one in sample_rate calls is logged and the message is formatted by logging only when level is enabled
+    -> Setting wrapper.stats.enabled = False reduces the wrapper to one attribute check
+    """
+    if sample_rate < 1:
+        raise ValueError(f"sample_rate must be >= 1: got {sample_rate}")
+
+    def decorator(func: Callable) -> Callable:
+        stats = _instruments.setdefault(name or func.__qualname__, CallStats(name or func.__qualname__))
+
+        clock = time.perf_counter_ns
+        record = stats.record
+
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            if not stats.enabled:
+                return func(*args, **kwargs)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                stats.errors += 1
+                raise
+            finally:
+                elapsed = clock() - start
+                if record(elapsed) % sample_rate == 0 and log.isEnabledFor(level):
+                    log.log(level, "%s args: %r, kwargs: %r took %dns", stats.name, args, kwargs, elapsed)
+
+        wrapper.stats = stats
+        return wrapper
+
+    return decorator
+
+
+def instrumentation_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Point in time copy of the stats of every instrumented function"""
+    return {name: stats.snapshot() for name, stats in list(_instruments.items())}
+
+
+def _fib_pair(number: int, mod: Optional[int] = None) -> tuple:
+    """Return (F(n), F(n + 1)) with fast doubling, O(log n) multiplications
+
+    F(2k) = F(k) * (2 * F(k + 1) - F(k))
+    F(2k + 1) = F(k) ** 2 + F(k + 1) ** 2
+    """
+    if number < 0:
+        raise ValueError(f"Fibonacci number is not defined for negative index: {number}")
+    a, b = 0, 1
+    for bit in bin(number)[2:]:
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        if bit == "1":
+            a, b = d, c + d
+        else:
+            a, b = c, d
+        if mod is not None:
+            a, b = a % mod, b % mod
+    return a, b
+
+
+def fibonacci_linear(number: int) -> int:
+    """Reference implementation, one big-int addition per step"""
     a, b = 0, 1
-    while number > 1:
+    for _ in range(number):
         a, b = b, a + b
-        number -= 1
-    return b
+    return a
+
+
+@instrument(sample_rate=100)
+@memoize(maxsize=1024)
+def fibonacci(number) -> int:
+    return _fib_pair(number)[0]
+
+
+def fibonacci_many(numbers: Iterable[int]) -> List[int]:
+    """Fibonacci numbers for a batch of indexes, returned in input order
+
+    Indexes are sorted and each one is reached from the previous pair using
+    F(m + k) = F(m + 1) * F(k) + F(m) * (F(k + 1) - F(k)), so only the gaps are doubled up.
+    """
+    numbers = list(numbers)
+    results = {}
+    prev, (fm, fm1) = 0, (0, 1)
+    for number in sorted(set(numbers)):
+        fk, fk1 = _fib_pair(number - prev)
+        fm, fm1 = fm1 * fk + fm * (fk1 - fk), fm1 * fk1 + fm * fk
+        results[number] = fm
+        prev = number
+    return [results[number] for number in numbers]
+
+
+def fibonacci_mod(number: int, mod: int) -> int:
+    """F(n) % mod without building the full big integer"""
+    if mod <= 0:
+        raise ValueError(f"Modulus must be positive: got {mod}")
+    return _fib_pair(number, mod)[0] % mod
+
+
+def benchmark_fibonacci(numbers: Iterable[int] = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7),
+                        linear_limit: int = 10 ** 5) -> None:
+    """Compare the linear loop with fast doubling, the loop is skipped above linear_limit"""
+    for number in numbers:
+        s = time.perf_counter()
+        _fib_pair(number)
+        fast = time.perf_counter() - s
+        if number <= linear_limit:
+            s = time.perf_counter()
+            fibonacci_linear(number)
+            linear = f"{time.perf_counter() - s:.4f}s"
+        else:
+            linear = "skipped"
+        logger.info(f"n={number}: fast doubling {fast:.4f}s, linear loop {linear}")
 
 
 if __name__ == '__main__':
-    s = time.time()
-    logger.info(fibonacci(90000))
-    e = time.time()
-    logger.info(f"First time taken: {(e - s)}")
-
-    logger.info(fibonacci(90000))
-    e1 = time.time()
-    logger.info(f'Second time took: {(e1 - e)}')
+    sys.set_int_max_str_digits(0)
+    if "--benchmark" in sys.argv:
+        benchmark_fibonacci()
+    else:
+        s = time.time()
+        logger.info(fibonacci(90000))
+        e = time.time()
+        logger.info(f"First time taken: {(e - s)}")
+
+        logger.info(fibonacci(90000))
+        e1 = time.time()
+        logger.info(f'Second time took: {(e1 - e)}')
+
+        logger.info(instrumentation_snapshot())
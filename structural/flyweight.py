@@ -17,9 +17,29 @@ Example:
         like: video games, 3-D graphics processing, real-time systems, and so forth can benefit from it
 
 """
+import sys
+import math
+import time
+import heapq
 import random
+import struct
+import threading
+import multiprocessing
+import tracemalloc
+import zlib
+from array import array
 from enum import Enum
-from typing import Dict
+from functools import partial
+from itertools import repeat
+from multiprocessing import shared_memory
+from typing import (Any, Callable, Dict, Hashable, Iterable, List, MutableMapping, Optional, Sequence, Set, TextIO,
+                    Tuple, Union)
+from weakref import WeakValueDictionary
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class CarType(Enum):
@@ -28,22 +48,630 @@ class CarType(Enum):
     suv = "suv"
 
 
-class Car:
+def _default_key(*args, **kwargs) -> Hashable:
+    return args + tuple(sorted(kwargs.items())) if kwargs else args
+
+
+class FlyweightFactory:
+    """Thread safe interning factory for immutable objects
+
+    -> key(*args, **kwargs) decides which calls share one object, by default all the call arguments
+    -> Lookups of existing flyweights take no lock, creation locks one of stripes locks picked by key hash
+    -> With weak=True the pool is a WeakValueDictionary, so flyweights nobody references any more get collected
+    -> Hit counter is updated without a lock and may slightly under count under thread contention
+    """
 
-    pool: Dict[str, object] = dict()
+    def __init__(self, constructor: Callable, key: Optional[Callable[..., Hashable]] = None, weak: bool = False,
+                 stripes: int = 16) -> None:
+        self.constructor = constructor
+        self.key = key or _default_key
+        self.weak = weak
+        self.hits = 0
+        self.misses = 0
+        self._created_bytes = 0
+        self._pool: MutableMapping[Hashable, Any] = WeakValueDictionary() if weak else dict()
+        self._locks = [threading.Lock() for _ in range(stripes)]
 
-    def __new__(cls, car_type: CarType) -> object:
-        obj = cls.pool.get(car_type.name)
-        if not obj:
-            obj = object.__new__(cls)
-            cls.pool[car_type.name] = obj
-            obj.car_type = car_type.name
+    def __call__(self, *args, **kwargs) -> Any:
+        key = self.key(*args, **kwargs)
+        obj = self._pool.get(key)
+        if obj is None:
+            with self._locks[hash(key) % len(self._locks)]:
+                obj = self._pool.get(key)
+                if obj is None:
+                    obj = self.constructor(*args, **kwargs)
+                    self._pool[key] = obj
+                    self.misses += 1
+                    self._created_bytes += sys.getsizeof(obj) + sys.getsizeof(getattr(obj, "__dict__", None))
+                    return obj
+        self.hits += 1
         return obj
 
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pool
+
+    def keys(self) -> List[Hashable]:
+        return list(self._pool.keys())
+
+    def values(self) -> List[Any]:
+        return list(self._pool.values())
+
+    def clear(self) -> None:
+        self._pool.clear()
+        self.hits = self.misses = self._created_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, hit rate and memory saved estimated as hits * average size of a created flyweight"""
+        calls = self.hits + self.misses
+        average_bytes = self._created_bytes / self.misses if self.misses else 0
+        return {
+            "size": len(self._pool),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / calls if calls else 0.0,
+            "bytes_saved": int(self.hits * average_bytes),
+        }
+
+
+class FlyweightMeta(type):
+    """Metaclass that routes instantiation through a per class FlyweightFactory available as cls.pool
+
+    >>> class Color(metaclass=FlyweightMeta, key=lambda name: name.lower()):
+    ...     def __init__(self, name):
+    ...         self.name = name
+    >>> Color("Red") is Color("red")
+    True
+    """
+
+    def __new__(mcs, name: str, bases: tuple, namespace: dict, key: Optional[Callable[..., Hashable]] = None,
+                weak: bool = False, stripes: int = 16) -> type:
+        cls = super().__new__(mcs, name, bases, namespace)
+        parent = getattr(cls, "pool", None)
+        if key is None and isinstance(parent, FlyweightFactory):
+            key = parent.key
+        cls.pool = FlyweightFactory(partial(type.__call__, cls), key=key, weak=weak, stripes=stripes)
+        return cls
+
+    def __init__(cls, name: str, bases: tuple, namespace: dict, **kwargs) -> None:
+        super().__init__(name, bases, namespace)
+
+    def __call__(cls, *args, **kwargs) -> Any:
+        return cls.pool(*args, **kwargs)
+
+
+class Car(metaclass=FlyweightMeta, key=lambda car_type: car_type.name):
+
+    def __init__(self, car_type: CarType) -> None:
+        self.car_type = car_type.name
+
     def render(self, color: str, x: float, y: float) -> None:
         print(f"Render car type: {self.car_type} with color: {color} at {x}, {y}")
 
 
+class CarFleet:
+    """Extrinsic state of many cars stored column wise (struct of arrays) next to the shared Car flyweights
+
+    -> Each car costs one car type index (uint8), one color index into an interned palette (uint16)
+       and two float32 coordinates, instead of one Python object per car
+    -> Columns are NumPy arrays when NumPy is installed, typed array.array columns otherwise
+    -> NumPy columns are preallocated buffers that double when full, types/colors/xs/ys are views of the filled
+       part, so adding cars one by one stays amortized O(1)
+    """
+
+    def __init__(self, use_numpy: bool = True) -> None:
+        self.use_numpy = use_numpy and np is not None
+        self.flyweights: List[Car] = []
+        self.palette: List[str] = []
+        self._type_ids: Dict[str, int] = {}
+        self._color_ids: Dict[str, int] = {}
+        self._size = 0
+        if self.use_numpy:
+            self._columns = [np.empty(0, dtype=dtype) for dtype in ("uint8", "uint16", "float32", "float32")]
+        else:
+            self._columns = [array("B"), array("H"), array("f"), array("f")]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _column(self, index: int) -> Any:
+        column = self._columns[index]
+        return column[:self._size] if self.use_numpy else column
+
+    @property
+    def types(self) -> Any:
+        return self._column(0)
+
+    @property
+    def colors(self) -> Any:
+        return self._column(1)
+
+    @property
+    def xs(self) -> Any:
+        return self._column(2)
+
+    @property
+    def ys(self) -> Any:
+        return self._column(3)
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self._columns[0])
+        if size <= capacity:
+            return None
+        capacity = max(size, 2 * capacity, 16)
+        for index, column in enumerate(self._columns):
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[index] = grown
+
+    def type_id(self, car_type: CarType) -> int:
+        type_id = self._type_ids.get(car_type.name)
+        if type_id is None:
+            if len(self.flyweights) > 0xFF:
+                raise ValueError("CarFleet supports at most 256 car types")
+            type_id = self._type_ids[car_type.name] = len(self.flyweights)
+            self.flyweights.append(Car(car_type))
+        return type_id
+
+    def color_id(self, color: str) -> int:
+        color_id = self._color_ids.get(color)
+        if color_id is None:
+            if len(self.palette) > 0xFFFF:
+                raise ValueError("CarFleet palette supports at most 65536 colors")
+            color_id = self._color_ids[color] = len(self.palette)
+            self.palette.append(color)
+        return color_id
+
+    def add(self, car_type: CarType, color: str, x: float, y: float) -> int:
+        index = self._size
+        values = (self.type_id(car_type), self.color_id(color), float(x), float(y))
+        if self.use_numpy:
+            self._reserve(index + 1)
+            for column, value in zip(self._columns, values):
+                column[index] = value
+        else:
+            for column, value in zip(self._columns, values):
+                column.append(value)
+        self._size = index + 1
+        return index
+
+    def add_many(self, car_types: Union[CarType, Iterable[CarType]], colors: Union[str, Iterable[str]],
+                 xs: Sequence[float], ys: Sequence[float]) -> range:
+        """Append len(xs) cars, a single car type or color is used for every car. Returns the new car indexes"""
+        count = len(xs)
+        if len(ys) != count:
+            raise ValueError(f"xs and ys must have same length: got {count} and {len(ys)}")
+        types = array("B", repeat(self.type_id(car_types), count) if isinstance(car_types, CarType)
+                      else map(self.type_id, car_types))
+        colors = array("H", repeat(self.color_id(colors), count) if isinstance(colors, str)
+                       else map(self.color_id, colors))
+        if not len(types) == len(colors) == count:
+            raise ValueError("car_types and colors must have same length as xs")
+        start, end = self._size, self._size + count
+        if self.use_numpy:
+            self._reserve(end)
+            type_column, color_column, x_column, y_column = self._columns
+            type_column[start:end] = np.frombuffer(types, dtype=np.uint8)
+            color_column[start:end] = np.frombuffer(colors, dtype=np.uint16)
+            x_column[start:end] = np.asarray(xs, dtype=np.float32)
+            y_column[start:end] = np.asarray(ys, dtype=np.float32)
+        else:
+            xs, ys = array("f", xs), array("f", ys)
+            type_column, color_column, x_column, y_column = self._columns
+            type_column.extend(types)
+            color_column.extend(colors)
+            x_column.extend(xs)
+            y_column.extend(ys)
+        self._size = end
+        return range(start, end)
+
+    def move(self, dx: Union[float, Sequence[float]], dy: Union[float, Sequence[float]],
+             indexes: Optional[Sequence[int]] = None) -> None:
+        """Shift the given cars (all by default) by scalar or per car offsets"""
+        if self.use_numpy:
+            selected = slice(None) if indexes is None else np.asarray(indexes)
+            self.xs[selected] += np.asarray(dx, dtype=np.float32)
+            self.ys[selected] += np.asarray(dy, dtype=np.float32)
+            return None
+        indexes = range(len(self)) if indexes is None else indexes
+        dxs = repeat(dx) if isinstance(dx, (int, float)) else dx
+        dys = repeat(dy) if isinstance(dy, (int, float)) else dy
+        xs, ys = self.xs, self.ys
+        for index, step_x, step_y in zip(indexes, dxs, dys):
+            xs[index] += step_x
+            ys[index] += step_y
+
+    def render(self, buffer: TextIO) -> None:
+        """Write every car with the same format as Car.render into buffer instead of printing it"""
+        names = [car.car_type for car in self.flyweights]
+        palette = self.palette
+        columns = (self.types, self.colors, self.xs, self.ys)
+        if self.use_numpy:
+            columns = tuple(column.tolist() for column in columns)
+        buffer.writelines(
+            f"Render car type: {names[car_type]} with color: {palette[color]} at {x}, {y}\n"
+            for car_type, color, x, y in zip(*columns)
+        )
+
+
+class PlacedCar:
+    """One Python object per car, the baseline CarFleet is measured against"""
+
+    def __init__(self, car: Car, color: str, x: float, y: float) -> None:
+        self.car = car
+        self.color = color
+        self.x = x
+        self.y = y
+
+
+def benchmark_fleet_memory(count: int = 10 ** 6) -> None:
+    rnd = random.Random(7)
+    colors = 'white black silver gray red blue brown beige yellow green'.split()
+    xs = [rnd.uniform(0, 100) for _ in range(count)]
+    ys = [rnd.uniform(0, 100) for _ in range(count)]
+    car_colors = [rnd.choice(colors) for _ in range(count)]
+    car = Car(CarType.compact)
+
+    tracemalloc.start()
+    objects = [PlacedCar(car, color, x, y) for color, x, y in zip(car_colors, xs, ys)]
+    objects_bytes = tracemalloc.get_traced_memory()[0]
+    del objects
+    tracemalloc.stop()
+
+    results = {}
+    for use_numpy in {False, np is not None}:
+        tracemalloc.start()
+        fleet = CarFleet(use_numpy=use_numpy)
+        fleet.add_many(CarType.compact, car_colors, xs, ys)
+        results["numpy" if fleet.use_numpy else "array"] = tracemalloc.get_traced_memory()[0]
+        del fleet
+        tracemalloc.stop()
+
+    print(f"{count} cars as objects: {objects_bytes / count:.1f} bytes per car")
+    for backend, fleet_bytes in results.items():
+        print(f"{count} cars in CarFleet({backend}): {fleet_bytes / count:.1f} bytes per car")
+
+
+class SpatialGrid:
+    """Uniform grid index of placements (id -> x, y), e.g. the rows of a CarFleet or the x, y passed to Car.render
+
+    -> The world is cut into square cells of cell_size, each cell keeps the set of ids placed inside it
+    -> Range queries only visit the cells overlapping the viewport, k nearest queries grow rings of cells
+       around the point until no unvisited cell can hold a closer placement
+    -> Pick cell_size close to the usual viewport size
+    """
+
+    def __init__(self, cell_size: float = 10.0) -> None:
+        if cell_size <= 0:
+            raise ValueError(f"cell_size must be positive: got {cell_size}")
+        self.cell_size = cell_size
+        self.positions: Dict[Hashable, Tuple[float, float]] = {}
+        self.cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._bounds: Optional[List[int]] = None
+
+    @classmethod
+    def from_fleet(cls, fleet: CarFleet, cell_size: float = 10.0) -> "SpatialGrid":
+        grid = cls(cell_size)
+        xs, ys = fleet.xs, fleet.ys
+        if fleet.use_numpy:
+            xs, ys = xs.tolist(), ys.tolist()
+        grid.bulk_load(range(len(fleet)), xs, ys)
+        return grid
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self.positions
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def _add_to_cell(self, key: Tuple[int, int], item: Hashable) -> None:
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = set()
+            self._extend_bounds(key)
+        cell.add(item)
+
+    def _extend_bounds(self, key: Tuple[int, int]) -> None:
+        """Cell bounds only grow, they stay a safe upper bound for nearest() after deletes"""
+        bounds = self._bounds
+        if bounds is None:
+            self._bounds = [key[0], key[1], key[0], key[1]]
+        else:
+            bounds[0], bounds[1] = min(bounds[0], key[0]), min(bounds[1], key[1])
+            bounds[2], bounds[3] = max(bounds[2], key[0]), max(bounds[3], key[1])
+
+    def insert(self, item: Hashable, x: float, y: float) -> None:
+        if item in self.positions:
+            return self.move(item, x, y)
+        self.positions[item] = (x, y)
+        self._add_to_cell(self._cell(x, y), item)
+
+    def bulk_load(self, items: Iterable[Hashable], xs: Iterable[float], ys: Iterable[float]) -> None:
+        """Insert many new placements in one pass, ids must not be in the index yet"""
+        size = self.cell_size
+        positions, cells = self.positions, self.cells
+        for item, x, y in zip(items, xs, ys):
+            positions[item] = (x, y)
+            key = (int(x // size), int(y // size))
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = set()
+                self._extend_bounds(key)
+            cell.add(item)
+
+    def move(self, item: Hashable, x: float, y: float) -> None:
+        old_cell = self._cell(*self.positions[item])
+        new_cell = self._cell(x, y)
+        self.positions[item] = (x, y)
+        if old_cell != new_cell:
+            self._discard(old_cell, item)
+            self._add_to_cell(new_cell, item)
+
+    def delete(self, item: Hashable) -> None:
+        self._discard(self._cell(*self.positions.pop(item)), item)
+
+    def _discard(self, key: Tuple[int, int], item: Hashable) -> None:
+        cell = self.cells[key]
+        cell.discard(item)
+        if not cell:
+            del self.cells[key]
+
+    def query_range(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[Hashable]:
+        """Ids placed inside the viewport, bounds included"""
+        (cx0, cy0), (cx1, cy1) = self._cell(min_x, min_y), self._cell(max_x, max_y)
+        positions, cells = self.positions, self.cells
+        found = []
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+            keys = [key for key in cells if cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1]
+        else:
+            keys = [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)]
+        for key in keys:
+            cell = cells.get(key)
+            if not cell:
+                continue
+            inner = cx0 < key[0] < cx1 and cy0 < key[1] < cy1
+            if inner:
+                found.extend(cell)
+                continue
+            for item in cell:
+                x, y = positions[item]
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    found.append(item)
+        return found
+
+    def nearest(self, x: float, y: float, k: int = 1) -> List[Tuple[float, Hashable]]:
+        """k closest placements as (distance, id), closest first"""
+        if k <= 0 or not self.positions:
+            return []
+        cx, cy = self._cell(x, y)
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        max_ring = max(abs(cx - min_cx), abs(cx - max_cx), abs(cy - min_cy), abs(cy - max_cy))
+        # rings closer than the Chebyshev distance to the occupied bounds are empty, start at the first that isn't
+        first_ring = max(min_cx - cx, cx - max_cx, min_cy - cy, cy - max_cy, 0)
+        positions, cells = self.positions, self.cells
+        best: List[Tuple[float, int, Hashable]] = []
+        counter = probed = 0
+        for ring in range(first_ring, max_ring + 1):
+            if ring == 0:
+                keys = [(cx, cy)]
+            else:
+                # only the part of the ring inside the bounds
+                x_range = range(max(cx - ring, min_cx), min(cx + ring, max_cx) + 1)
+                y_range = range(max(cy - ring + 1, min_cy), min(cy + ring - 1, max_cy) + 1)
+                rows = [ky for ky in (cy - ring, cy + ring) if min_cy <= ky <= max_cy]
+                columns = [kx for kx in (cx - ring, cx + ring) if min_cx <= kx <= max_cx]
+                probed += len(rows) * len(x_range) + len(columns) * len(y_range)
+                if probed > len(cells):
+                    # sparse grid, probing empty cells costs more than scanning the occupied cells left
+                    keys = [key for key in cells if max(abs(key[0] - cx), abs(key[1] - cy)) >= ring]
+                else:
+                    keys = [(kx, ky) for ky in rows for kx in x_range] + [(kx, ky) for kx in columns for ky in y_range]
+            for key in keys:
+                for item in cells.get(key, ()):
+                    px, py = positions[item]
+                    counter += 1
+                    entry = (-math.hypot(px - x, py - y), counter, item)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+            if probed > len(cells) or (len(best) == k and -best[0][0] <= ring * self.cell_size):
+                break
+        return [(-distance, item) for distance, _, item in sorted(best, reverse=True)]
+
+
+def benchmark_spatial_index(sizes: Iterable[int] = (10 ** 5, 10 ** 6), queries: int = 100,
+                            world: float = 10_000.0, viewport: float = 100.0, k: int = 10) -> None:
+    """Range and k nearest query time of SpatialGrid against a linear scan, 10 ** 7 works but needs a few GB"""
+    rnd = random.Random(11)
+    for size in sizes:
+        fleet = CarFleet(use_numpy=False)
+        fleet.add_many(CarType.compact, "white", [rnd.uniform(0, world) for _ in range(size)],
+                       [rnd.uniform(0, world) for _ in range(size)])
+        start = time.perf_counter()
+        grid = SpatialGrid.from_fleet(fleet, cell_size=viewport)
+        build = time.perf_counter() - start
+        points = [(rnd.uniform(0, world - viewport), rnd.uniform(0, world - viewport)) for _ in range(queries)]
+        xs, ys = fleet.xs.tolist(), fleet.ys.tolist()
+
+        start = time.perf_counter()
+        for x, y in points:
+            grid.query_range(x, y, x + viewport, y + viewport)
+        grid_range = (time.perf_counter() - start) / queries
+        start = time.perf_counter()
+        for x, y in points[:10]:
+            [i for i, (px, py) in enumerate(zip(xs, ys)) if x <= px <= x + viewport and y <= py <= y + viewport]
+        scan_range = (time.perf_counter() - start) / 10
+
+        start = time.perf_counter()
+        for x, y in points:
+            grid.nearest(x, y, k)
+        grid_knn = (time.perf_counter() - start) / queries
+        start = time.perf_counter()
+        for x, y in points[:10]:
+            heapq.nsmallest(k, ((math.hypot(px - x, py - y), i) for i, (px, py) in enumerate(zip(xs, ys))))
+        scan_knn = (time.perf_counter() - start) / 10
+
+        print(f"{size} placements: grid build {build:.2f}s, "
+              f"range query grid {grid_range * 1e6:.0f}us vs scan {scan_range * 1e6:.0f}us, "
+              f"{k} nearest grid {grid_knn * 1e6:.0f}us vs scan {scan_knn * 1e6:.0f}us")
+
+
+class SharedInternTable:
+    """Append only table of interned strings in multiprocessing.shared_memory, addressed by integer handles
+
+    -> Layout: uint32 entry count, an open addressing index of uint32 slots (handle + 1, 0 is empty) keyed by
+       crc32 of the value, then fixed size records (uint16 length + utf-8 bytes)
+    -> Every process reads records and probes the index in place, nothing is copied into per process dicts,
+       so memory per worker doesn't grow with the table
+    -> New entries are written under a cross process lock: record first, then its index slot, then the count
+    """
+
+    HEADER = struct.Struct("<I")
+    LENGTH = struct.Struct("<H")
+    SLOT = struct.Struct("<I")
+
+    def __init__(self, capacity: int = 1024, record_size: int = 64, lock: Optional[Any] = None,
+                 name: Optional[str] = None) -> None:
+        self.capacity = capacity
+        self.record_size = record_size
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        # at most half full, probe sequences stay short
+        self.slots = 1 << max(2 * capacity - 1, 1).bit_length()
+        self._records_offset = self.HEADER.size + self.slots * self.SLOT.size
+        size = self._records_offset + capacity * record_size
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.shm.buf[:self._records_offset] = bytes(self._records_offset)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "record_size": self.record_size, "lock": self.lock, "name": self.shm.name}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def __len__(self) -> int:
+        return self.HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def __getitem__(self, handle: int) -> str:
+        if not 0 <= handle < len(self):
+            raise IndexError(f"No interned value for handle {handle}")
+        offset = self._records_offset + handle * self.record_size
+        length = self.LENGTH.unpack_from(self.shm.buf, offset)[0]
+        start = offset + self.LENGTH.size
+        return bytes(self.shm.buf[start:start + length]).decode()
+
+    def _find(self, encoded: bytes) -> Tuple[Optional[int], int]:
+        """(handle of encoded or None, index slot where the probe stopped)"""
+        buf, mask = self.shm.buf, self.slots - 1
+        slot = zlib.crc32(encoded) & mask
+        while True:
+            entry = self.SLOT.unpack_from(buf, self.HEADER.size + slot * self.SLOT.size)[0]
+            if not entry:
+                return None, slot
+            offset = self._records_offset + (entry - 1) * self.record_size
+            start = offset + self.LENGTH.size
+            if (self.LENGTH.unpack_from(buf, offset)[0] == len(encoded)
+                    and buf[start:start + len(encoded)] == encoded):
+                return entry - 1, slot
+            slot = (slot + 1) & mask
+
+    def intern(self, value: str) -> int:
+        encoded = value.encode()
+        handle, _ = self._find(encoded)
+        if handle is not None:
+            return handle
+        if len(encoded) > self.record_size - self.LENGTH.size:
+            raise ValueError(f"Value {value!r} does not fit in a {self.record_size} bytes record")
+        with self.lock:
+            handle, slot = self._find(encoded)
+            if handle is not None:
+                return handle
+            handle = len(self)
+            if handle >= self.capacity:
+                raise ValueError(f"SharedInternTable is full: capacity {self.capacity}")
+            offset = self._records_offset + handle * self.record_size
+            self.LENGTH.pack_into(self.shm.buf, offset, len(encoded))
+            self.shm.buf[offset + self.LENGTH.size:offset + self.LENGTH.size + len(encoded)] = encoded
+            self.SLOT.pack_into(self.shm.buf, self.HEADER.size + slot * self.SLOT.size, handle + 1)
+            self.HEADER.pack_into(self.shm.buf, 0, handle + 1)
+        return handle
+
+    def close(self) -> None:
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+
+class SharedCarPool:
+    """Car flyweights and color palette shared by every worker process through SharedInternTable
+
+    -> Workers receive the pool once (e.g. as multiprocessing.Pool initargs) and attach to the same segments
+    -> Cars and colors are exchanged as small integer handles, only the intrinsic state lives in shared memory,
+       the Car object of a handle is rebuilt once per process through the regular Car flyweight pool
+    """
+
+    def __init__(self, type_capacity: int = 256, palette_capacity: int = 4096) -> None:
+        self.types = SharedInternTable(capacity=type_capacity, record_size=32)
+        self.palette = SharedInternTable(capacity=palette_capacity, record_size=32)
+
+    def car_handle(self, car_type: CarType) -> int:
+        return self.types.intern(car_type.name)
+
+    def color_handle(self, color: str) -> int:
+        return self.palette.intern(color)
+
+    def car(self, handle: int) -> Car:
+        return Car(CarType[self.types[handle]])
+
+    def render(self, car_handle: int, color_handle: int, x: float, y: float) -> None:
+        self.car(car_handle).render(self.palette[color_handle], x, y)
+
+    def close(self) -> None:
+        self.types.close()
+        self.palette.close()
+
+    def unlink(self) -> None:
+        self.types.unlink()
+        self.palette.unlink()
+
+
+_worker_pool: Optional[SharedCarPool] = None
+
+
+def _attach_worker(pool: SharedCarPool) -> None:
+    global _worker_pool
+    _worker_pool = pool
+
+
+def _worker_colors(colors: List[str]) -> List[Tuple[int, int]]:
+    return [(_worker_pool.car_handle(CarType.compact), _worker_pool.color_handle(color)) for color in colors]
+
+
+def run_shared_pool_workers(workers: int = 4) -> None:
+    """Workers intern colors concurrently into the shared palette and every process resolves the same handles"""
+    pool = SharedCarPool()
+    colors = 'white black silver gray red blue brown beige yellow green'.split()
+    try:
+        with multiprocessing.Pool(workers, initializer=_attach_worker, initargs=(pool,)) as workers_pool:
+            results = workers_pool.map(_worker_colors, [colors[i:] + colors[:i] for i in range(workers)])
+        handles = {pool.palette[handle]: handle for batch in results for _, handle in batch}
+        print(f"{workers} workers interned {len(pool.palette)} colors into shared memory: {handles}")
+        car_handle, color_handle = results[0][0]
+        pool.render(car_handle, color_handle, 1.0, 2.0)
+    finally:
+        pool.close()
+        pool.unlink()
+
+
 def main():
     rnd = random.Random()
     colors = 'white black silver gray red blue brown beige yellow green'.split()
@@ -67,7 +695,18 @@ def main():
 
     print(f"Total objects creation are called : {car_counter} times")
     print(f"But only {len(Car.pool.keys())} objects are created : {Car.pool.values()}")
+    print(f"Flyweight pool stats: {Car.pool.stats()}")
+
+
+def benchmark():
+    """Fleet memory, spatial index and shared pool benchmarks, run with --benchmark"""
+    benchmark_fleet_memory()
+    benchmark_spatial_index(sizes=(10 ** 5,))
+    run_shared_pool_workers()
 
 
 if __name__ == '__main__':
-    main()
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        main()
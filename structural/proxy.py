@@ -17,37 +17,628 @@ Example:
 """
 
 
-from typing import List
+import contextlib
+import copy
+import hashlib
+import hmac
+import io
+import multiprocessing
+import os
+import pickle
+import secrets
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial, wraps
+from itertools import count, islice
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from structural.decorator import MemoCache
 
 
 class SensitiveInfo:
+    """Users kept in insertion order with a hash index for membership and an optional sorted prefix index"""
 
-    def __init__(self) -> None:
+    def __init__(self, prefix_index: bool = False) -> None:
         self.users: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._sorted: Optional[List[str]] = [] if prefix_index else None
+        self._unsorted: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def contains(self, user: str) -> bool:
+        return user in self._positions
+
+    def read(self, page_size: Optional[int] = None, cursor: int = 0) -> Optional[int]:
+        """Print one page of users starting at cursor and return the cursor of next page, None when done.
+        Without page_size all the remaining users are printed."""
+        end = len(self.users) if page_size is None else min(cursor + page_size, len(self.users))
+        print(f"List of users {cursor}-{end} of {len(self.users)} are : {self.users[cursor:end]}")
+        return end if end < len(self.users) else None
 
-    def read(self) -> None:
-        print(f"List of all users are : {self.users}")
+    def iter_users(self, page_size: int = 1000, cursor: int = 0) -> Iterator[List[str]]:
+        """Stream users page by page without copying the whole list"""
+        while cursor < len(self.users):
+            yield self.users[cursor:cursor + page_size]
+            cursor += page_size
 
     def add(self, user) -> None:
+        if user in self._positions:
+            print(f"User {user} is already exist")
+            return None
         print(f"Adding user : {user}")
+        self._append(user)
+
+    def add_many(self, users: Iterable[str]) -> int:
+        """Add all new users in one go without printing each of them, returns how many were added.
+        The batch is transactional, if any user fails none of them is kept."""
+        start, pending = len(self.users), len(self._unsorted)
+        try:
+            for user in users:
+                if not isinstance(user, str):
+                    raise TypeError(f"User must be str: got {type(user)}")
+                if user not in self._positions:
+                    self._append(user)
+        except BaseException:
+            for user in self.users[start:]:
+                del self._positions[user]
+            del self.users[start:]
+            del self._unsorted[pending:]
+            raise
+        added = len(self.users) - start
+        print(f"Added {added} users")
+        return added
+
+    def _append(self, user: str) -> None:
+        self._positions[user] = len(self.users)
         self.users.append(user)
+        if self._sorted is not None:
+            self._unsorted.append(user)
+
+    def search_prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Users starting with prefix in sorted order, needs SensitiveInfo(prefix_index=True)"""
+        if self._sorted is None:
+            raise ValueError("Prefix search is disabled. Create SensitiveInfo with prefix_index=True")
+        if self._unsorted:
+            self._unsorted.sort()
+            self._sorted.extend(self._unsorted)
+            self._sorted.sort()
+            self._unsorted.clear()
+        start = bisect_left(self._sorted, prefix)
+        found = []
+        for user in islice(self._sorted, start, None):
+            if not user.startswith(prefix) or len(found) == limit:
+                break
+            found.append(user)
+        return found
+
+
+_MISSING = object()
+_IMMUTABLE = (str, bytes, int, float, complex, bool, type(None), tuple, frozenset)
+
+
+class VirtualProxy:
+    """Generic virtual/caching proxy
+
+    --> The subject is built by factory on first attribute access, not when the proxy is created
+    --> A method looked up once is stored on the proxy, so next calls don't go through __getattr__
+    --> Results of read_only methods are memoized and handed out as shallow copies, so callers can't alter the
+        cached value. Calls with unhashable arguments skip the cache
+    --> passthrough methods are called as they are, e.g. reads with side effects or returning iterators
+    --> Calling any other method or setting an attribute through the proxy counts as a write and clears the
+        memoized results
+    --> Thread safe: the subject is built once under a lock, and a read that overlapped a write (seen through
+        the write version and the count of writes in progress) returns its result without caching it
+    """
+
+    _internals = ("_factory", "_subject", "_read_only", "_passthrough", "_memoized", "_maxsize", "_lock",
+                  "_version", "_writers")
+
+    def __init__(self, factory: Callable[[], Any], read_only: Iterable[str] = (), passthrough: Iterable[str] = (),
+                 maxsize: int = 128) -> None:
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_subject", None)
+        object.__setattr__(self, "_read_only", frozenset(read_only))
+        object.__setattr__(self, "_passthrough", frozenset(passthrough))
+        object.__setattr__(self, "_memoized", [])
+        object.__setattr__(self, "_maxsize", maxsize)
+        object.__setattr__(self, "_lock", threading.RLock())
+        object.__setattr__(self, "_version", 0)
+        object.__setattr__(self, "_writers", 0)
+
+    @property
+    def is_built(self) -> bool:
+        return self._subject is not None
+
+    def _get_subject(self) -> Any:
+        if self._subject is None:
+            with self._lock:
+                if self._subject is None:
+                    object.__setattr__(self, "_subject", self._factory())
+        return self._subject
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._get_subject(), name)
+        if not callable(attr):
+            return attr
+        if name in self._read_only:
+            attr = self._reader(attr)
+        elif name not in self._passthrough:
+            attr = self._writer(attr)
+        self.__dict__[name] = attr
+        return attr
+
+    def _reader(self, method: Callable) -> Callable:
+        cache = MemoCache(maxsize=self._maxsize)
+        self._memoized.append(cache)
+
+        @wraps(method)
+        def wrapper(*args, **kwargs) -> Any:
+            key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+            try:
+                value = cache.get(key, _MISSING)
+            except TypeError:
+                return method(*args, **kwargs)
+            if value is _MISSING:
+                version, writers = self._version, self._writers
+                value = method(*args, **kwargs)
+                with self._lock:
+                    if not writers and not self._writers and version == self._version:
+                        cache.set(key, value)
+            return value if isinstance(value, _IMMUTABLE) else copy.copy(value)
+        return wrapper
+
+    def _writer(self, method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(*args, **kwargs) -> Any:
+            self._begin_write()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._end_write()
+        return wrapper
+
+    def _begin_write(self) -> None:
+        with self._lock:
+            object.__setattr__(self, "_writers", self._writers + 1)
+            object.__setattr__(self, "_version", self._version + 1)
+
+    def _end_write(self) -> None:
+        with self._lock:
+            object.__setattr__(self, "_writers", self._writers - 1)
+            object.__setattr__(self, "_version", self._version + 1)
+            self._clear()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in self._internals:
+            object.__setattr__(self, name, value)
+            return None
+        subject = self._get_subject()
+        self._begin_write()
+        try:
+            setattr(subject, name, value)
+            self.__dict__.pop(name, None)
+        finally:
+            self._end_write()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            object.__setattr__(self, "_version", self._version + 1)
+            self._clear()
+
+    def _clear(self) -> None:
+        for cache in self._memoized:
+            cache.clear()
 
 
 class Info:
-    """Protected proxy to SensitiveInfo"""
+    """Protected proxy to SensitiveInfo
 
-    def __init__(self) -> None:
-        self.sensitive_info = SensitiveInfo()
+    --> authenticate() checks the secret once and returns a signed session token valid for session_ttl seconds
+    --> Token holders can add users in batches, the token is verified once per batch instead of once per user
+    """
+
+    def __init__(self, prefix_index: bool = False, session_ttl: float = 300.0) -> None:
+        self.sensitive_info = VirtualProxy(partial(SensitiveInfo, prefix_index=prefix_index),
+                                           read_only=("contains", "search_prefix"),
+                                           passthrough=("read", "iter_users"))
         self.secret = "ABcDE12"  # Just for demo purpose, Not recommended hardcoded secret or passwords in source code
+        self.session_ttl = session_ttl
+        self._session_key = secrets.token_bytes(32)
 
-    def read(self) -> None:
-        self.sensitive_info.read()
+    def read(self, page_size: Optional[int] = None, cursor: int = 0) -> Optional[int]:
+        return self.sensitive_info.read(page_size, cursor)
 
-    def add(self, user) -> None:
+    def contains(self, user: str) -> bool:
+        return self.sensitive_info.contains(user)
+
+    def search_prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        return self.sensitive_info.search_prefix(prefix, limit)
+
+    def _check_secret(self, sec: str) -> bool:
+        return hmac.compare_digest(sec.encode(), self.secret.encode())
+
+    def _sign(self, payload: str) -> str:
+        return hmac.new(self._session_key, payload.encode(), hashlib.sha256).hexdigest()
+
+    def authenticate(self, sec: str) -> str:
+        """Exchange the secret for a session token, raises PermissionError for a wrong secret"""
+        if not self._check_secret(sec):
+            raise PermissionError("Invalid secret code")
+        payload = f"{secrets.token_hex(8)}:{time.time() + self.session_ttl:.3f}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> None:
+        """Raise PermissionError unless token was issued by this proxy and has not expired"""
+        payload, _, signature = token.rpartition(".")
+        if not payload or not hmac.compare_digest(signature, self._sign(payload)):
+            raise PermissionError("Invalid session token")
+        if float(payload.rpartition(":")[2]) < time.time():
+            raise PermissionError("Session token expired")
+
+    def add(self, user, token: Optional[str] = None) -> None:
+        if token is not None:
+            self.verify(token)
+            self.sensitive_info.add(user)
+            return None
         sec = input("Enter secret code: ")
-        if sec == self.secret:
+        if self._check_secret(sec):
             self.sensitive_info.add(user)
 
+    def add_many(self, users: Iterable[str], token: Optional[str] = None) -> int:
+        if token is None:
+            token = self.authenticate(input("Enter secret code: "))
+        self.verify(token)
+        return self.sensitive_info.add_many(users)
+
+
+def benchmark_bulk_load(count: int = 10 ** 6, batch_size: int = 10_000, per_user_sample: int = 10 ** 5) -> None:
+    """Users per second loaded with one token check per batch against one check per user"""
+    users = [f"user{i}" for i in range(count)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        info = Info()
+        token = info.authenticate(info.secret)
+        start = time.perf_counter()
+        for i in range(0, count, batch_size):
+            info.add_many(users[i:i + batch_size], token)
+        batched = time.perf_counter() - start
+
+        info = Info()
+        token = info.authenticate(info.secret)
+        start = time.perf_counter()
+        for user in users[:per_user_sample]:
+            info.add(user, token)
+        per_user = time.perf_counter() - start
+    print(f"Batched load: {count / batched:,.0f} users/s, "
+          f"per user check: {per_user_sample / per_user:,.0f} users/s")
+
+
+_FRAME = struct.Struct("<I")
+
+
+def _send_frame(sock: socket.socket, payload: Any) -> None:
+    data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_FRAME.pack(len(data)) + data)
+
+
+def _recv_exact(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError("Connection closed")
+    return data
+
+
+def _recv_frame(stream: BinaryIO) -> Any:
+    size = _FRAME.unpack(_recv_exact(stream, _FRAME.size))[0]
+    return pickle.loads(_recv_exact(stream, size))
+
+
+def _connect(address: Union[str, Tuple[str, int]]) -> socket.socket:
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(address)
+    if family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+class _RemoteHandler(socketserver.StreamRequestHandler):
+    """Runs every call of a request frame in order and answers with one response frame"""
+
+    def handle(self) -> None:
+        server = self.server
+        while True:
+            try:
+                calls = _recv_frame(self.rfile)
+            except EOFError:
+                return None
+            results = []
+            for request_id, method, args, kwargs in calls:
+                try:
+                    with server.subject_lock:
+                        value = getattr(server.subject, method)(*args, **kwargs)
+                    results.append((request_id, True, value))
+                except Exception as exc:
+                    results.append((request_id, False, RuntimeError(f"{type(exc).__name__}: {exc}")))
+            _send_frame(self.connection, results)
+
+
+class _ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+
+class RemoteServer:
+    """Hosts one subject behind a Unix socket path or a (host, port) TCP address
+
+    --> Frames are a uint32 length followed by a pickled list of calls (request_id, method, args, kwargs),
+        answered by one frame of (request_id, ok, value) results. Pickle is used, so only trusted local clients
+        must be allowed to connect.
+    --> Calls to the subject are serialized with a lock, each client connection is served by its own thread
+    """
+
+    def __init__(self, subject: Any, address: Union[str, Tuple[str, int]]) -> None:
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.remove(address)
+            server_class = _ThreadingUnixServer
+        else:
+            server_class = _ThreadingTCPServer
+        self.server = server_class(address, _RemoteHandler)
+        self.server.subject = subject
+        self.server.subject_lock = threading.Lock()
+        self.address = self.server.server_address
+
+    def serve_forever(self) -> None:
+        self.server.serve_forever()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _serve(factory: Callable[[], Any], address: Union[str, Tuple[str, int]], ready: Any) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        server = RemoteServer(factory(), address)
+        ready.set()
+        server.serve_forever()
+
+
+def serve_in_process(factory: Callable[[], Any], address: Union[str, Tuple[str, int]]) -> multiprocessing.Process:
+    """Start a RemoteServer for factory() in a separate process and wait until it accepts connections"""
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=_serve, args=(factory, address, ready), daemon=True)
+    process.start()
+    ready.wait()
+    return process
+
+
+class _Connection:
+    """One pipelined client connection
+
+    --> Calls are queued with a request id and answered through Futures by a reader thread
+    --> Whoever holds the send lock writes every queued call in one frame, so calls made while a frame is
+        being sent are batched together automatically
+    """
+
+    def __init__(self, address: Union[str, Tuple[str, int]]) -> None:
+        self.sock = _connect(address)
+        self.pending: List[tuple] = []
+        self.futures: Dict[int, Future] = {}
+        self.ids = count()
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def submit(self, method: str, args: tuple, kwargs: dict, flush: bool = True) -> Future:
+        future = Future()
+        with self.lock:
+            request_id = next(self.ids)
+            self.futures[request_id] = future
+            self.pending.append((request_id, method, args, kwargs))
+        if flush:
+            self.flush()
+        return future
+
+    def flush(self) -> None:
+        """Send every queued call, calls that can't be sent get the error through their future"""
+        with self.send_lock:
+            with self.lock:
+                calls, self.pending = self.pending, []
+            if not calls:
+                return None
+            try:
+                _send_frame(self.sock, calls)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # nothing was sent yet, fail only the calls that don't pickle and send the others
+                sendable = []
+                for call in calls:
+                    try:
+                        pickle.dumps(call, protocol=pickle.HIGHEST_PROTOCOL)
+                        sendable.append(call)
+                    except Exception as exc:
+                        self._fail([call], exc)
+                self._send(sendable)
+            except OSError as exc:
+                self._fail(calls, exc)
+
+    def _send(self, calls: List[tuple]) -> None:
+        if not calls:
+            return None
+        try:
+            _send_frame(self.sock, calls)
+        except Exception as exc:
+            self._fail(calls, exc)
+
+    def _fail(self, calls: List[tuple], exc: BaseException) -> None:
+        with self.lock:
+            futures = [self.futures.pop(call[0], None) for call in calls]
+        for future in futures:
+            if future is not None:
+                future.set_exception(exc)
+
+    def _read(self) -> None:
+        stream = self.sock.makefile("rb")
+        try:
+            while True:
+                for request_id, ok, value in _recv_frame(stream):
+                    with self.lock:
+                        future = self.futures.pop(request_id)
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+        except (EOFError, OSError):
+            with self.lock:
+                futures, self.futures = self.futures, {}
+            for future in futures.values():
+                future.set_exception(ConnectionError("Remote proxy connection closed"))
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class RemoteProxy:
+    """Remote proxy to an object hosted by RemoteServer
+
+    --> proxy.method(*args) blocks for the result, proxy.call_async("method", *args) returns a Future so many
+        calls can be outstanding (pipelined) on one connection
+    --> Calls are spread round robin over a pool of pool_size connections opened on first use
+    --> Inside "with proxy.batch():" calls are only queued and are sent in one round trip when the block exits,
+        a blocking proxy.method(*args) in the block sends everything queued so far together with itself
+    """
+
+    def __init__(self, address: Union[str, Tuple[str, int]], pool_size: int = 4) -> None:
+        self._address = address
+        self._pool_size = pool_size
+        self._connections: List[_Connection] = []
+        self._next = count()
+        self._lock = threading.Lock()
+        self._batching = threading.local()
+
+    def _connection(self) -> _Connection:
+        if len(self._connections) < self._pool_size:
+            with self._lock:
+                if len(self._connections) < self._pool_size:
+                    self._connections.append(_Connection(self._address))
+                    return self._connections[-1]
+        return self._connections[next(self._next) % len(self._connections)]
+
+    def call_async(self, method: str, *args, **kwargs) -> Future:
+        batch = getattr(self._batching, "connection", None)
+        if batch is not None:
+            return batch.submit(method, args, kwargs, flush=False)
+        return self._connection().submit(method, args, kwargs)
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        connection = self._batching.connection = self._connection()
+        try:
+            yield None
+        finally:
+            self._batching.connection = None
+            connection.flush()
+
+    def __getattr__(self, name: str) -> Callable:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def remote_method(*args, **kwargs) -> Any:
+            future = self.call_async(name, *args, **kwargs)
+            batch = getattr(self._batching, "connection", None)
+            if batch is not None:
+                # waiting on a call that is still queued would never return
+                batch.flush()
+            return future.result()
+
+        remote_method.__name__ = name
+        self.__dict__[name] = remote_method
+        return remote_method
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+
+class NaiveRemoteProxy:
+    """Opens a new connection for every call, the baseline RemoteProxy is measured against"""
+
+    def __init__(self, address: Union[str, Tuple[str, int]]) -> None:
+        self._address = address
+
+    def __getattr__(self, name: str) -> Callable:
+        def remote_method(*args, **kwargs) -> Any:
+            with _connect(self._address) as sock:
+                _send_frame(sock, [(0, name, args, kwargs)])
+                with sock.makefile("rb") as stream:
+                    _, ok, value = _recv_frame(stream)[0]
+            if not ok:
+                raise value
+            return value
+
+        return remote_method
+
+
+def benchmark_remote_proxy(calls: int = 20_000, threads: int = 8) -> None:
+    """Calls per second of contains() against a SensitiveInfo hosted in a separate server process"""
+    with tempfile.TemporaryDirectory() as directory:
+        address = os.path.join(directory, "sensitive_info.sock")
+        server = serve_in_process(SensitiveInfo, address)
+        try:
+            naive = NaiveRemoteProxy(address)
+            naive.add_many([f"user{i}" for i in range(1000)])
+            results = {}
+            start = time.perf_counter()
+            for i in range(calls // 10):
+                naive.contains(f"user{i}")
+            results["naive, connection per call"] = calls // 10 / (time.perf_counter() - start)
+
+            proxy = RemoteProxy(address, pool_size=4)
+            start = time.perf_counter()
+            for i in range(calls):
+                proxy.contains(f"user{i}")
+            results["pooled, one call at a time"] = calls / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            futures = [proxy.call_async("contains", f"user{i}") for i in range(calls)]
+            [future.result() for future in futures]
+            results["pooled, pipelined"] = calls / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with proxy.batch():
+                futures = [proxy.call_async("contains", f"user{i}") for i in range(calls)]
+            [future.result() for future in futures]
+            results["pooled, one batch"] = calls / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(threads) as executor:
+                list(executor.map(proxy.contains, (f"user{i}" for i in range(calls))))
+            results[f"pooled, {threads} threads"] = calls / (time.perf_counter() - start)
+            proxy.close()
+        finally:
+            server.terminate()
+            server.join()
+    for name, rate in results.items():
+        print(f"{name}: {rate:,.0f} calls/s")
+
 
 def main():
     """Client code"""
@@ -57,7 +648,9 @@ def main():
         print("\n 1. Read users \n 2. Add user \n 3. quite \n")
         choice = input("\nEnter your choice: ")
         if choice == '1':
-            info.read()
+            cursor = info.read(page_size=20)
+            while cursor is not None and input("Show next page? (y/n): ") == 'y':
+                cursor = info.read(page_size=20, cursor=cursor)
         elif choice == '2':
             user = input("\nEnter username to add: ")
             info.add(user)
@@ -68,5 +661,14 @@ def main():
             exit()
 
 
+def benchmark():
+    """Bulk load and remote proxy benchmarks, run with --benchmark"""
+    benchmark_bulk_load()
+    benchmark_remote_proxy()
+
+
 if __name__ == '__main__':
-    main()
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        main()